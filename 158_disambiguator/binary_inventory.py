@@ -0,0 +1,112 @@
+import os
+import gzip
+import mmap
+import codecs
+import struct
+
+import numpy as np
+
+# Binary inventory layout, written by graph_induction.py -binary and read by egvi:
+#   magic (8 bytes), number of senses (uint64), size of the string blob (uint64),
+#   sense records sorted by word (SENSE_DTYPE), utf-8 string blob.
+# Offsets in the records point into the blob.
+BINARY_MAGIC = b"158INV\x00\x01"
+BINARY_HEADER = struct.Struct("<8sQQ")
+SENSE_DTYPE = np.dtype([("word", "<u8"), ("word_len", "<u4"), ("cid", "<i4"),
+                        ("keyword", "<u8"), ("keyword_len", "<u4"),
+                        ("cluster", "<u8"), ("cluster_len", "<u4")])
+
+
+def open_inventory(inventory_fpath: str):
+    """Opens a plain or gzipped inventory TSV file for reading."""
+    if inventory_fpath.endswith(".gz"):
+        return gzip.open(inventory_fpath, "rt", encoding="utf-8")
+    return codecs.open(inventory_fpath, "r", "utf-8")
+
+
+def write_binary_inventory(inventory_fpath: str, binary_fpath: str):
+    """
+    Converts an inventory TSV file into the binary format that the disambiguator memory-maps.
+    :param inventory_fpath: path to the inventory TSV (optionally gzipped)
+    :param binary_fpath: path to the output binary file
+    """
+    senses = []
+    blob = bytearray()
+
+    def add(string):
+        encoded = string.encode("utf-8")
+        offset = len(blob)
+        blob.extend(encoded)
+        return offset, len(encoded)
+
+    with open_inventory(inventory_fpath) as f:
+        next(f)  # header
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) != 4:
+                continue
+            word, cid, keyword, cluster = fields
+            senses.append((word.encode("utf-8"), int(cid), add(word), add(keyword), add(cluster)))
+
+    senses.sort(key=lambda sense: sense[0])  # stable, keeps the cluster order of a word
+    records = np.zeros(len(senses), dtype=SENSE_DTYPE)
+    for i, (_, cid, word, keyword, cluster) in enumerate(senses):
+        records[i] = (word[0], word[1], cid, keyword[0], keyword[1], cluster[0], cluster[1])
+
+    tmp_fpath = binary_fpath + ".tmp"
+    with open(tmp_fpath, "wb") as out:
+        out.write(BINARY_HEADER.pack(BINARY_MAGIC, len(records), len(blob)))
+        out.write(records.tobytes())
+        out.write(blob)
+    os.replace(tmp_fpath, binary_fpath)
+    return binary_fpath
+
+
+class BinaryInventory(object):
+    """ Memory-mapped word sense inventory in the binary format, senses are sorted by word. """
+
+    def __init__(self, inventory_fpath: str):
+        self.inventory_fpath = inventory_fpath
+        with open(inventory_fpath, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, senses_number, blob_size = BINARY_HEADER.unpack_from(self._mmap, 0)
+        if magic != BINARY_MAGIC:
+            raise Exception("Not a binary inventory: {}".format(inventory_fpath))
+
+        self._senses = np.frombuffer(self._mmap, dtype=SENSE_DTYPE, count=senses_number, offset=BINARY_HEADER.size)
+        self._blob_offset = BINARY_HEADER.size + senses_number * SENSE_DTYPE.itemsize
+
+    def __len__(self):
+        return len(self._senses)
+
+    def _string(self, offset, length) -> bytes:
+        start = self._blob_offset + int(offset)
+        return self._mmap[start:start + int(length)]
+
+    def _word(self, index: int) -> bytes:
+        return self._string(self._senses["word"][index], self._senses["word_len"][index])
+
+    def _lower_bound(self, word: bytes) -> int:
+        low, high = 0, len(self._senses)
+        while low < high:
+            middle = (low + high) // 2
+            if self._word(middle) < word:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get(self, word: str):
+        """ Returns a list of (word, cid, keyword, cluster) tuples of the word. """
+        encoded = word.encode("utf-8")
+        senses = []
+        index = self._lower_bound(encoded)
+        while index < len(self._senses) and self._word(index) == encoded:
+            sense = self._senses[index]
+            senses.append((word,
+                           int(sense["cid"]),
+                           self._string(sense["keyword"], sense["keyword_len"]).decode("utf-8"),
+                           self._string(sense["cluster"], sense["cluster_len"]).decode("utf-8")))
+            index += 1
+        return senses
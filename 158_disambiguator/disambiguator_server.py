@@ -4,10 +4,11 @@ import os
 import sys
 import configparser
 
-from flask import Flask, request, jsonify
+from flask import Flask
 from flasgger import Swagger
 
 from egvi import WSDGensim, WSDPSQL
+from wire_format import get_request_data, make_response
 
 CONFIG_PATH = '158.ini'
 
@@ -62,6 +63,71 @@ def sense_to_dict(sense):
             "cluster": sense.cluster}
 
 
+def get_option(req_json, name):
+    """Returns an optional positive integer option of the request or None."""
+    value = req_json.get(name)
+    if value is None:
+        return None
+    if type(value) != int or value < 1:
+        raise Exception("{} should be a positive integer".format(name))
+    return value
+
+
+def compact_senses(tokens_senses, top=None, max_cluster_words=None, sense_refs=False):
+    """
+    Shrinks the disambiguation results.
+    :param tokens_senses: list of senses for every token as returned by disambiguate_text
+    :param top: keep only the top senses of every token by confidence
+    :param max_cluster_words: keep only the first words of every cluster
+    :param sense_refs: send every distinct sense once: the result is {"senses": [...], "tokens": [...]}
+    where every token sense has the index of its sense in "senses" instead of word, keyword and cluster
+    :return: the compacted results
+    """
+    if top is not None:
+        tokens_senses = [sorted(token_senses, key=lambda sense: sense["confidence"], reverse=True)[:top]
+                         for token_senses in tokens_senses]
+    if max_cluster_words is not None:
+        tokens_senses = [[dict(sense, cluster=sense["cluster"][:max_cluster_words]) for sense in token_senses]
+                         for token_senses in tokens_senses]
+    if not sense_refs:
+        return tokens_senses
+
+    senses = []
+    sense_ids = {}
+    tokens = []
+    for token_senses in tokens_senses:
+        token_refs = []
+        for sense in token_senses:
+            key = (sense["word"], sense["keyword"], tuple(sense["cluster"]))
+            if key not in sense_ids:
+                sense_ids[key] = len(senses)
+                senses.append({"word": sense["word"], "keyword": sense["keyword"], "cluster": sense["cluster"]})
+            token_refs.append({"token": sense["token"], "sense": sense_ids[key], "confidence": sense["confidence"]})
+        tokens.append(token_refs)
+    return {"senses": senses, "tokens": tokens}
+
+
+def to_columns(senses_list):
+    """
+    Columnar layout of the results of compact_senses: "counts" has the number of senses of every token
+    and the other lists have a value for every sense of every token, in the order of the tokens.
+    With sense references, the distinct senses are columns too.
+    """
+    if isinstance(senses_list, dict):
+        senses, tokens_senses = senses_list["senses"], senses_list["tokens"]
+        fields = ["token", "sense", "confidence"]
+    else:
+        senses, tokens_senses = None, senses_list
+        fields = ["token", "word", "keyword", "cluster", "confidence"]
+
+    columns = {"counts": [len(token_senses) for token_senses in tokens_senses]}
+    for field in fields:
+        columns[field] = [sense[field] for token_senses in tokens_senses for sense in token_senses]
+    if senses is not None:
+        columns["senses"] = {field: [sense[field] for sense in senses] for field in ("word", "keyword", "cluster")}
+    return columns
+
+
 @app.route("/disambiguate", methods=['POST'])
 def disambiguate():
     """
@@ -83,6 +149,24 @@ def disambiguate():
               type: string
             required: true
             description: list of context tokens to disambiguate
+          - name: top
+            in: body
+            type: integer
+            description: Return only this many senses with the highest confidence for every token.
+          - name: max_cluster_words
+            in: body
+            type: integer
+            description: Return only this many words of every sense cluster.
+          - name: sense_refs
+            in: body
+            type: boolean
+            description: Return every distinct sense once as {"senses", "tokens"}, the senses of the tokens
+              refer to them by their index in the "sense" field.
+          - name: columnar
+            in: body
+            type: boolean
+            description: Return a list of values for every field instead of a list of senses for every token,
+              "counts" has the number of senses of every token.
         responses:
           500:
             description: Bad request
@@ -114,13 +198,16 @@ def disambiguate():
                         description: Identified token from the request.
         """
 
-    if request.is_json:
-        req_json = request.json
-    else:
-        raise Exception("Request is not json")
+    req_json = get_request_data()
+    if req_json is None:
+        raise Exception("Request is neither JSON nor MessagePack")
 
     req_language = req_json['language']
     tokens = req_json['tokens']
+    top = get_option(req_json, 'top')
+    max_cluster_words = get_option(req_json, 'max_cluster_words')
+    sense_refs = bool(req_json.get('sense_refs', False))
+    columnar = bool(req_json.get('columnar', False))
 
     input_msg = "Disambiguation:\n" \
                 "Language: {lang}\n" \
@@ -135,6 +222,10 @@ def disambiguate():
     else:
         raise Exception("Unknown language: {}".format(req_language))
 
+    senses_list = compact_senses(senses_list, top=top, max_cluster_words=max_cluster_words, sense_refs=sense_refs)
+    if columnar:
+        senses_list = to_columns(senses_list)
+
     output_msg = "Results \n" \
                  "Lang: {lang}\n" \
                  "Tokens: {tokens}\n" \
@@ -142,8 +233,7 @@ def disambiguate():
                  "{senses}".format(lang=req_language, tokens=tokens, senses=senses_list)
     print(output_msg)
 
-    results_json = jsonify(senses_list)
-    return results_json
+    return make_response(senses_list)
 
 
 @app.route("/senses", methods=['POST'])
@@ -186,10 +276,9 @@ def senses():
                     type: string
                     description: Token from the request.
         """
-    if request.is_json:
-        req_json = request.json
-    else:
-        raise Exception("Request is not json")
+    req_json = get_request_data()
+    if req_json is None:
+        raise Exception("Request is neither JSON nor MessagePack")
 
     req_language = req_json['language']
     word = req_json['word'].strip()
@@ -212,8 +301,7 @@ def senses():
         results_dict = sense_to_dict(sense)
         results.append(results_dict)
 
-    results_json = jsonify(results)
-    return results_json
+    return make_response(results)
 
 
 if __name__ == '__main__':
@@ -9,10 +9,12 @@ from typing import List, Tuple
 from collections import namedtuple
 from operator import itemgetter
 
-from gensim.models import KeyedVectors
 from numpy import mean
 from pandas import read_csv
 
+from binary_inventory import BinaryInventory
+from vector_cache import load_vectors
+
 SenseBase = namedtuple('Sense', 'word keyword cluster')
 
 
@@ -57,11 +59,7 @@ class WSD(object):
         self.language = language
         wv_fpath, wv_pkl_fpath = ensure_word_embeddings(self.language)
         print('Loading KeyedVectors: {}'.format(self.language))
-        self._wv = KeyedVectors.load_word2vec_format(wv_fpath,
-                                                     binary=False,
-                                                     unicode_errors="ignore",
-                                                     limit=dictionary)
-        self._wv.init_sims(replace=True)  # normalize the loaded vectors to L2 norm
+        self._wv = load_vectors(wv_fpath, limit=dictionary)  # normalized, memory-mapped from a binary cache
         print('Loading inventory: {}'.format(language))
 
         self._inventory = self._load_inventory()
@@ -70,6 +68,9 @@ class WSD(object):
         self._skip_unknown_words = skip_unknown_words
 
     def _load_inventory(self):
+        if self.inventory_fpath.endswith(".bin"):
+            return BinaryInventory(self.inventory_fpath)
+
         inventory_df = read_csv(self.inventory_fpath, sep="\t", encoding="utf-8", quoting=csv.QUOTE_NONE)
         inventory_df['cluster_words'] = inventory_df.cluster.str.split(",")
         return inventory_df
@@ -81,6 +82,13 @@ class WSD(object):
             words.add(token.title())
             words.add(token.lower())
 
+        if isinstance(self._inventory, BinaryInventory):
+            senses = []
+            for word in sorted(words):
+                for _, _, keyword, cluster in self._inventory.get(word):
+                    senses.append(Sense(word, keyword, cluster.split(",")))
+            return senses
+
         senses_pd = self._inventory.loc[self._inventory.word.isin(words)]
         senses_raw = list(senses_pd.itertuples(name='Row', index=False))
 
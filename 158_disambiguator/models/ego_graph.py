@@ -0,0 +1,120 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class EgoGraph(object):
+    """Undirected weighted ego network stored as a CSR adjacency matrix."""
+
+    def __init__(self, name: str, nodes: Sequence[str], sizes: Sequence[int],
+                 indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray):
+        self.name = name
+        self.nodes = list(nodes)
+        self.sizes = np.asarray(sizes, dtype=np.int32)
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.labels = np.arange(1, len(self.nodes) + 1, dtype=np.int32)
+
+    @classmethod
+    def from_edges(cls, name: str, nodes: Sequence[str], sizes: Sequence[int],
+                   src: np.ndarray, dst: np.ndarray, weights: np.ndarray):
+        """
+        Builds a symmetric CSR graph from a list of edges given as node index arrays.
+        Self-loops are dropped; when an edge is given several times (in either direction)
+        the last weight is kept, as networkx does.
+        :param name: ego word
+        :param nodes: list of node words
+        :param sizes: node sizes (number of anti-pairs the node takes part in)
+        :param src: source node indices
+        :param dst: destination node indices
+        :param weights: edge weights
+        :return: EgoGraph
+        """
+        nodes_number = len(nodes)
+        src = np.asarray(src, dtype=np.int32)
+        dst = np.asarray(dst, dtype=np.int32)
+        weights = np.asarray(weights, dtype=np.float32)
+
+        mask = src != dst
+        low = np.minimum(src[mask], dst[mask])
+        high = np.maximum(src[mask], dst[mask])
+        weights = weights[mask]
+
+        # the first occurrence in the reversed arrays is the last one added
+        keys = low.astype(np.int64) * max(nodes_number, 1) + high
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - last
+        low, high, weights = low[last], high[last], weights[last]
+
+        rows = np.concatenate([low, high])
+        cols = np.concatenate([high, low])
+        vals = np.concatenate([weights, weights])
+        order = np.lexsort((cols, rows))
+
+        indptr = np.zeros(nodes_number + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=nodes_number), out=indptr[1:])
+        return cls(name, nodes, sizes, indptr, cols[order], vals[order])
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def edges_number(self) -> int:
+        return len(self.indices) // 2
+
+    def neighbors(self, node_index: int) -> np.ndarray:
+        return self.indices[self.indptr[node_index]:self.indptr[node_index + 1]]
+
+    def chinese_whispers(self, iterations: int = 20, seed: int = 0) -> np.ndarray:
+        """
+        Clusters the graph with Chinese Whispers using the "top" weighting, i.e. raw edge weights.
+        Nodes are visited in a shuffled order drawn from a seeded generator, so the labels are
+        deterministic for a given seed; ties between labels go to the smaller label.
+        :param iterations: maximum number of iterations
+        :param seed: random seed
+        :return: array of node labels
+        """
+        rng = np.random.RandomState(seed)
+        nodes_number = len(self.nodes)
+        labels = np.arange(1, nodes_number + 1, dtype=np.int32)
+        order = np.flatnonzero(np.diff(self.indptr) > 0)
+        # with non-positive weights a label absent from the neighbourhood could win with a zero score
+        positive = len(self.weights) == 0 or self.weights.min() > 0
+
+        for _ in range(iterations):
+            changes = False
+            rng.shuffle(order)
+            for node_index in order:
+                start, end = self.indptr[node_index], self.indptr[node_index + 1]
+                neighbor_labels = labels[self.indices[start:end]]
+                scores = np.bincount(neighbor_labels, weights=self.weights[start:end], minlength=nodes_number + 1)
+                if not positive:
+                    scores[np.bincount(neighbor_labels, minlength=nodes_number + 1) == 0] = -np.inf
+                label = scores.argmax()
+                if label != labels[node_index]:
+                    labels[node_index] = label
+                    changes = True
+            if not changes:
+                break
+
+        self.labels = labels
+        return labels
+
+    def clusters(self) -> Dict[int, List[str]]:
+        """Groups node words by their label, in the order of the nodes."""
+        clusters = dict()
+        for node, label in zip(self.nodes, self.labels.tolist()):
+            clusters.setdefault(label, []).append(node)
+        return clusters
+
+    def to_dict(self) -> Dict:
+        """Compact JSON-serializable form of the clustered graph, used to render plots on demand."""
+        src = np.repeat(np.arange(len(self.nodes), dtype=np.int32), np.diff(self.indptr))
+        mask = src < self.indices
+        return {"word": self.name,
+                "nodes": self.nodes,
+                "sizes": self.sizes.tolist(),
+                "labels": self.labels.tolist(),
+                "edges": [[int(i), int(j), round(float(w), 3)]
+                          for i, j, w in zip(src[mask], self.indices[mask], self.weights[mask])]}
@@ -1,9 +1,13 @@
 import os
+import sys
 import pandas as pd
 import logging
-from gensim.models import KeyedVectors
 from sqlalchemy import create_engine
 
+# the vectors cache is shared with graph_induction and the disambiguator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from vector_cache import load_vectors  # noqa: E402
+
 PSQL_USER = "158_user"
 PSQL_PASSWORD = "158"
 PSQL_DB = "fasttext_vectors"
@@ -25,9 +29,7 @@ logging.basicConfig(
 
 
 def load_keyed_vectors(wv_fpath, limit):
-    wv = KeyedVectors.load_word2vec_format(wv_fpath, binary=False, unicode_errors="ignore", limit=limit)
-    wv.init_sims(replace=True)  # Normalize the loaded vectors to L2 norm
-    return wv
+    return load_vectors(wv_fpath, limit=limit)  # normalized to L2 norm, cached in a binary file
 
 
 def create_vectors_df(wv):
@@ -1,7 +1,11 @@
 import os
 import re
-import codecs
+import sys
+import json
+import zlib
 import logging
+import signal
+import threading
 import argparse
 from time import time
 from collections import Counter
@@ -11,24 +15,22 @@ import string
 
 import faiss
 import numpy as np
-import networkx as nx
-from networkx import Graph
-from gensim.models import KeyedVectors
-from chinese_whispers import chinese_whispers, aggregate_clusters
-
-import matplotlib
-import matplotlib.pyplot as plt
 
+from ego_graph import EgoGraph
 from load_fasttext import download_word_embeddings
+from inventory_writer import InventoryWriter
 
-matplotlib.use("pdf")  # speed up graph plot saving
+# the binary inventory format and the vectors cache are shared with the disambiguator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from binary_inventory import write_binary_inventory  # noqa: E402
+from vector_cache import load_vectors  # noqa: E402
 
 logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
 
 
 class GraphInductor(object):
     def __init__(self, language: str, faiss_gpu: bool, gpu_device: int, batch_size: int, chinese_whispers_n: int,
-                 inv_limit: int, emb_limit: int, visualize: int, show_plot: bool = False):
+                 inv_limit: int, emb_limit: int, visualize: int, seed: int = 0, shard: Tuple[int, int] = (0, 1)):
 
         self.language = language
         self.faiss_gpu = faiss_gpu
@@ -38,7 +40,8 @@ class GraphInductor(object):
         self.inv_limit = inv_limit
         self.emb_limit = emb_limit
         self.visualize = visualize
-        self.show_plot = show_plot
+        self.seed = seed
+        self.shard_index, self.shards_number = shard
 
         self.inventory_path = os.path.join("inventories", self.language)
         self.log_dir_path = os.path.join(self.inventory_path, "logs")
@@ -50,8 +53,11 @@ class GraphInductor(object):
         self.index_faiss = None
         self.voc = None
         self.voc_neighbors = None
+        self.voc_distances = None
         self.plt_path = None
         self.neighbors_number = None
+        self.filter_voc = None
+        self.stop_requested = False
 
     @staticmethod
     def _filter_voc_(voc):
@@ -59,6 +65,11 @@ class GraphInductor(object):
         re_filter = re.compile('^((?![\d.!?{},:()[\]"|/;_+%#<>№»«…*—$]).)*$')
         return [item for item in voc if (re_filter.search(item) is not None) and (item not in string.punctuation)]
 
+    @staticmethod
+    def _in_shard_(word: str, shard_index: int, shards_number: int) -> bool:
+        """Assigns the word to a shard by a hash that does not change between processes and machines."""
+        return zlib.crc32(word.encode("utf-8")) % shards_number == shard_index
+
     def _get_embedding_path_(self, language):
         """ Ensures that the word vectors exist by downloading them if needed. """
 
@@ -74,28 +85,33 @@ class GraphInductor(object):
         return wv_fpath
 
     def _load_vectors_(self, word_vectors_fpath: str):
-        """Loads gensim vectors from a file."""
+        """Loads normalized gensim vectors, memory-mapped from the binary cache of vector_cache."""
         self.logger_info.info("Loading word vectors from: {}".format(word_vectors_fpath))
         tic = time()
-        wv = KeyedVectors.load_word2vec_format(word_vectors_fpath,
-                                               binary=False,
-                                               unicode_errors="ignore",
-                                               limit=self.emb_limit)
+        wv = load_vectors(word_vectors_fpath, limit=self.emb_limit)
         self.logger_info.info("Loaded in {} sec.".format(time() - tic))
-        wv.init_sims(replace=True)
         return wv
 
     @staticmethod
     def _prepare_faiss_(wv, use_gpu: bool, gpu_device: int):
-        """Creates faiss index with word vectors."""
+        """
+        Creates faiss index with word vectors. The memory-mapped matrix is added at once: it is already
+        C-contiguous float32, so faiss copies it into storage of the exact size without reallocations.
+        On CPU the vectors of wv are replaced with a view of the index storage afterwards, so that the
+        mapping is released and only one copy of the matrix stays in memory.
+        """
         if use_gpu:
             res = faiss.StandardGpuResources()  # use a single GPU
             index_flat = faiss.IndexFlatIP(wv.vector_size)  # build a flat (CPU) index
             index_faiss = faiss.index_cpu_to_gpu(res, gpu_device, index_flat)  # make it into a gpu index
-            index_faiss.add(wv.vectors_norm)  # add vectors to the index
         else:
             index_faiss = faiss.IndexFlatIP(wv.vector_size)
-            index_faiss.add(wv.vectors_norm)
+
+        index_faiss.add(wv.vectors_norm)
+
+        if not use_gpu:
+            vectors = faiss.rev_swig_ptr(index_faiss.get_xb(), index_faiss.ntotal * index_faiss.d)
+            wv.vectors = wv.vectors_norm = vectors.reshape(index_faiss.ntotal, index_faiss.d)
         return index_faiss
 
     def _get_nns_(self, target: str, neighbors_number: int):
@@ -105,51 +121,118 @@ class GraphInductor(object):
         :param neighbors_number: number of neighbors
         :return: list of target neighbors
         """
-        target_neighbors = self.voc_neighbors[target]
-        if len(target_neighbors) >= neighbors_number:
-            return target_neighbors[:neighbors_number]
+        if neighbors_number <= self.voc_neighbors.shape[1]:
+            target_index = self.wv.vocab[target].index
+            target_neighbors = self.voc_neighbors[target_index, :neighbors_number]
+            target_distances = self.voc_distances[target_index, :neighbors_number]
+            return [(self.wv.index2word[i], d) for i, d in zip(target_neighbors, target_distances)]
         else:
             self.logger_error.error("neighbors_number {} is more than precomputed {}".format(neighbors_number,
-                                                                                             len(target_neighbors)))
+                                                                                             self.voc_neighbors.shape[1]))
+            exit(1)
+
+    def _get_neighbors_paths_(self, neighbors_number: int) -> Tuple[str, str, str]:
+        """Returns paths of the neighbors table (indices, distances) and of its checkpoint."""
+        prefix = os.path.join(self.inventory_path, "cc.{}.300.vec.gz.top{}.neighbors".format(self.language,
+                                                                                         neighbors_number))
+        return prefix + ".indices.npy", prefix + ".distances.npy", prefix + ".checkpoint.json"
+
+    @staticmethod
+    def _save_checkpoint_(checkpoint_fpath: str, checkpoint: Dict):
+        """Writes the checkpoint atomically, so that a crash never leaves a broken file."""
+        tmp_fpath = checkpoint_fpath + ".tmp"
+        with open(tmp_fpath, "w") as out:
+            json.dump(checkpoint, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_fpath, checkpoint_fpath)
+
+    @staticmethod
+    def _load_checkpoint_(checkpoint_fpath: str) -> Dict:
+        if not os.path.exists(checkpoint_fpath):
+            return {}
+        with open(checkpoint_fpath) as f:
+            return json.load(f)
+
+    def _check_resume_parameters_(self, checkpoint: Dict, parameters: Dict, checkpoint_fpath: str):
+        """Stops if the checkpoint was made by a run with other parameters."""
+        if checkpoint and checkpoint.get("parameters") != parameters:
+            self.logger_error.error("Cannot resume from {}: it was made with {}, current parameters are {}".format(
+                checkpoint_fpath, checkpoint.get("parameters"), parameters))
             exit(1)
 
-    def _calculate_nns_(self, neighbors_number: int) -> Dict:
+    def _calculate_nns_(self, neighbors_number: int, resume: bool = False,
+                        checkpoint_every: int = 10) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Calculate neighbors for targets by Faiss.
+        Calculate neighbors for targets by Faiss. The table is stored in memory-mapped .npy files
+        and checkpointed every checkpoint_every batches, so that it can be resumed or reused.
+        A complete table computed with the same parameters is always reused, e.g. by the shards.
         :param neighbors_number: number of neighbors
-        :return: dict of word -> list of neighbors
+        :param resume: continue from the saved neighbors table if it matches the vocabulary
+        :param checkpoint_every: number of batches between checkpoints
+        :return: arrays of neighbor indices and distances, a row per vocabulary word
         """
+        indices_fpath, distances_fpath, checkpoint_fpath = self._get_neighbors_paths_(neighbors_number)
+        shape = (len(self.voc), neighbors_number)
+
+        parameters = {"language": self.language, "emb_limit": self.emb_limit, "shape": list(shape)}
+
+        checkpoint = self._load_checkpoint_(checkpoint_fpath)
+        if checkpoint.get("parameters") == parameters and checkpoint["rows"] == len(self.voc):
+            self.logger_info.info("Using the precomputed neighbors from {}".format(indices_fpath))
+            return np.load(indices_fpath, mmap_mode="r"), np.load(distances_fpath, mmap_mode="r")
+        if self.shards_number > 1:
+            # shards only read the table, several of them writing it at once would break it
+            self.logger_error.error("No complete neighbors table at {}, compute it first with -neighbors_only".format(
+                indices_fpath))
+            exit(1)
+
+        if not resume:
+            checkpoint = {}
+        self._check_resume_parameters_(checkpoint, parameters, checkpoint_fpath)
+        if checkpoint:
+            done = checkpoint["rows"]
+            self.logger_info.info("Resuming neighbors from {} of {}".format(done, len(self.voc)))
+            nns_indices = np.lib.format.open_memmap(indices_fpath, mode="r+")
+            nns_distances = np.lib.format.open_memmap(distances_fpath, mode="r+")
+        else:
+            done = 0
+            nns_indices = np.lib.format.open_memmap(indices_fpath, mode="w+", dtype=np.int32, shape=shape)
+            nns_distances = np.lib.format.open_memmap(distances_fpath, mode="w+", dtype=np.float32, shape=shape)
 
-        word_neighbors_dict = dict()
         self.logger_info.info("Start Faiss with batches")
-        for start in range(0, len(self.voc), self.batch_size):
-            end = start + self.batch_size
+        for batch_number, start in enumerate(range(done, len(self.voc), self.batch_size)):
+            end = min(start + self.batch_size, len(self.voc))
             self.logger_info.info("batch {} to {} of {}".format(start, end, len(self.voc)))
-            batch_dict = self.__calculate_nns_batch__(self.voc[start:end], neighbors_number=neighbors_number)
-            word_neighbors_dict = {**word_neighbors_dict, **batch_dict}
-        return word_neighbors_dict
-
-    def __calculate_nns_batch__(self, targets: List, neighbors_number: int) -> Dict:
+            try:
+                I, D = self.__calculate_nns_batch__(start, end, neighbors_number=neighbors_number)
+            except KeyboardInterrupt:
+                nns_indices.flush()
+                nns_distances.flush()
+                self._save_checkpoint_(checkpoint_fpath, {"parameters": parameters, "rows": start})
+                self.logger_info.info("Interrupted at batch {}, run with -resume to continue".format(start))
+                raise
+            nns_indices[start:end] = I
+            nns_distances[start:end] = D
+
+            if (batch_number + 1) % checkpoint_every == 0 or end == len(self.voc):
+                nns_indices.flush()
+                nns_distances.flush()
+                self._save_checkpoint_(checkpoint_fpath, {"parameters": parameters, "rows": end})
+        return nns_indices, nns_distances
+
+    def __calculate_nns_batch__(self, start: int, end: int, neighbors_number: int) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Calculate nearest neighbors for the list of targets for a batch.
-        :param targets: list of target words
+        Calculate nearest neighbors for a batch of the vocabulary.
+        :param start: index of the first word of the batch
+        :param end: index after the last word of the batch
         :param neighbors_number: number of neighbors
-        :return: dict of word -> list of neighbors
+        :return: arrays of neighbor indices and distances, the target itself is skipped
         """
 
-        numpy_vec = np.array([self.wv[target] for target in targets])  # Create array of batch vectors
-        D, I = self.index_faiss.search(numpy_vec, neighbors_number + 1)  # Find neighbors
-
-        # Write neighbors into dict
-        word_neighbors_dict = dict()
-        for word_index, (_D, _I) in enumerate(zip(D, I)):
-            word = targets[word_index]
-            nns_list = []
-            for n, (d, i) in enumerate(zip(_D.ravel(), _I.ravel())):
-                if n > 0:
-                    nns_list.append((self.wv.index2word[i], d))
-            word_neighbors_dict[word] = nns_list
-        return word_neighbors_dict
+        batch_vectors = self.wv.vectors_norm[start:end]  # a view, rows of the vocabulary are contiguous
+        D, I = self.index_faiss.search(batch_vectors, neighbors_number + 1)  # Find neighbors
+        return I[:, 1:], D[:, 1:]
 
     @staticmethod
     def _in_nns_(nns: Tuple, word: str) -> bool:
@@ -180,11 +263,11 @@ class GraphInductor(object):
         nns_words = [row[0] for row in nns]
 
         # create vectors for ego, it's neighbors
-        wv_ego = np.array(self.wv[ego])
-        wv_neighbors = np.array([self.wv[nns_word] for nns_word in nns_words])
+        wv_ego = self.wv.vectors_norm[self.wv.vocab[ego].index]
+        wv_neighbors = self.wv.vectors_norm[[self.wv.vocab[nns_word].index for nns_word in nns_words]]
 
         # find words close to ego, but far to neighbors
-        wv_negative_neighbors = (wv_neighbors - wv_ego) * (-1)
+        wv_negative_neighbors = wv_ego - wv_neighbors
         dists, word_indices = self.index_faiss.search(wv_negative_neighbors, 2)
 
         # Write down anti_pairs
@@ -211,9 +294,37 @@ class GraphInductor(object):
             nodes.update([dst])
         return nodes
 
-    @staticmethod
-    def _list2dict_(lst: list) -> Dict:
-        return {p[0]: p[1] for p in lst}
+    def _get_related_edges_(self, node_words: List[str], pairs: Set,
+                            neighbors_number: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Connects the nodes of the ego network with their precomputed neighbors that are also nodes,
+        except for the anti-pairs. Works on the whole neighbor table block of the nodes at once.
+        :param node_words: nodes of the ego network
+        :param pairs: anti-pairs of words
+        :param neighbors_number: number of neighbors
+        :return: arrays of source node indices, destination node indices and weights
+        """
+        nodes_number = len(node_words)
+        node_ids = {node: i for i, node in enumerate(node_words)}
+        vocab_ids = np.array([self.wv.vocab[node].index for node in node_words], dtype=np.int64)
+
+        neighbors = self.voc_neighbors[vocab_ids, :neighbors_number]
+        distances = self.voc_distances[vocab_ids, :neighbors_number]
+
+        # map neighbor vocabulary ids to node indices
+        order = np.argsort(vocab_ids)
+        positions = np.searchsorted(vocab_ids[order], neighbors).clip(max=nodes_number - 1)
+        in_graph = vocab_ids[order][positions] == neighbors
+        dst = order[positions]
+
+        anti = np.zeros((nodes_number, nodes_number), dtype=bool)
+        for first, second in pairs:
+            anti[node_ids[first], node_ids[second]] = anti[node_ids[second], node_ids[first]] = True
+
+        src = np.repeat(np.arange(nodes_number)[:, None], neighbors.shape[1], axis=1)
+        mask = in_graph & ~anti[src, dst]
+        # row-major order: neighbors of each node by decreasing similarity, as returned by faiss
+        return src[mask], dst[mask], distances[mask]
 
     def _wsi_(self, ego: str, neighbors_number: int) -> Dict:
         """
@@ -223,76 +334,28 @@ class GraphInductor(object):
         :return: dict of network and nodes
         """
         tic = time()
-        ego_network = Graph(name=ego)
 
         pairs = self._calculate_anti_pairs_(ego, neighbors_number)
         nodes = self._get_nodes_(pairs)
+        node_words = sorted(nodes)  # set order of the pairs depends on the hash seed
+        src, dst, weights = self._get_related_edges_(node_words, pairs, neighbors_number)
 
-        ego_network.add_nodes_from([(node, {'size': size}) for node, size in nodes.items()])
-
-        for r_node in ego_network:
-            related_related_nodes = self._list2dict_(self._get_nns_(r_node, neighbors_number))
-            related_related_nodes_ego = sorted(
-                [(related_related_nodes[rr_node], rr_node) for rr_node in related_related_nodes if
-                 rr_node in ego_network],
-                reverse=True)[:neighbors_number]
-
-            related_edges = []
-            for w, rr_node in related_related_nodes_ego:
-                if self._get_pair_(r_node, rr_node) not in pairs:
-                    related_edges.append((r_node, rr_node, {"weight": w}))
-            ego_network.add_edges_from(related_edges)
-
-        chinese_whispers(ego_network, weighting="top", iterations=self.chinese_whispers_n)
+        ego_network = EgoGraph.from_edges(ego, node_words, [nodes[node] for node in node_words], src, dst, weights)
+        ego_network.chinese_whispers(iterations=self.chinese_whispers_n, seed=self.seed)
         self.logger_info.info("{}\t{:f} sec.".format(ego, time() - tic))
         return {"network": ego_network, "nodes": nodes}
 
-    def _draw_ego_(self, graph, save_fpath=""):
-        """Creates a plot of the graph."""
-        tic = time()
-
-        label2id = {}
-        colors = []
-        sizes = []
-        for node in graph.nodes():
-            label = graph.nodes[node]['label']
-            if label not in label2id:
-                label2id[label] = len(label2id) + 1
-            label_id = label2id[label]
-            colors.append(1. / label_id)
-            sizes.append(1500. * graph.nodes[node]['size'])
-
-        plt.clf()
-        fig = plt.gcf()
-        fig.set_size_inches(20, 20)
-
-        nx.draw_networkx(graph,
-                         cmap=plt.get_cmap('gist_rainbow'),
-                         pos=nx.spring_layout(graph, k=0.75),
-                         node_color=colors,
-                         font_color='black',
-                         font_size=16,
-                         font_weight='bold',
-                         alpha=0.75,
-                         node_size=sizes,
-                         edge_color='gray')
-
-        if self.show_plot:
-            plt.show()
-        if save_fpath != "":
-            plt.savefig(save_fpath)
-            self.logger_info.info("Plot saved at {}".format(save_fpath))
-
-        fig.clf()
-
-        self.logger_info.info("Created graph plot for: {} sec.".format(time() - tic))
+    def _save_ego_(self, graph: EgoGraph, save_fpath: str):
+        """Saves the clustered graph, the frontend renders plots from it on demand."""
+        with open(save_fpath, "w", encoding="utf-8") as out:
+            json.dump(graph.to_dict(), out, ensure_ascii=False)
         return None
 
     @staticmethod
     def _get_cluster_lines_(graph, nodes):
         """Writes clusters into a csv-file line."""
         lines = []
-        labels_clusters = sorted(aggregate_clusters(graph).items(), key=lambda e: len(e[1]), reverse=True)
+        labels_clusters = sorted(graph.clusters().items(), key=lambda e: len(e[1]), reverse=True)
         for label, cluster in labels_clusters:
             scored_words = []
             for word in cluster:
@@ -316,22 +379,24 @@ class GraphInductor(object):
         logger.addHandler(fh)
         return logger
 
-    def prepare_vocabulary(self, neighbors_number: int, filter_voc: bool):
-        """Loads embeddings and calculates neighbors for the vocabulary."""
+    def prepare_vocabulary(self, neighbors_number: int, filter_voc: bool, resume: bool = False):
+        """Loads embeddings and calculates neighbors for the vocabulary, then keeps the words of the shard."""
 
         wv_fpath = self._get_embedding_path_(self.language)
         self.neighbors_number = neighbors_number
+        self.filter_voc = filter_voc
         self.wv = self._load_vectors_(wv_fpath)
 
         self.index_faiss = self._prepare_faiss_(self.wv, self.faiss_gpu, self.gpu_device)
-        self.voc = list(self.wv.vocab.keys())
+        self.voc = list(self.wv.index2word)  # rows of the neighbors table follow the vectors
 
         self.logger_info.info("Language: {}".format(self.language))
         self.logger_info.info("Visualize: {}".format(self.visualize))
         self.logger_info.info("Vocabulary: {} words".format(len(self.voc)))
 
         # Load neighbors for vocabulary
-        self.voc_neighbors = self._calculate_nns_(neighbors_number=neighbors_number)
+        self.voc_neighbors, self.voc_distances = self._calculate_nns_(neighbors_number=neighbors_number,
+                                                                      resume=resume)
 
         # Init folder for inventory plots
         if self.visualize:
@@ -346,13 +411,41 @@ class GraphInductor(object):
         if self.inv_limit < len(self.voc):
             self.voc = self.voc[:self.inv_limit]
 
+        if self.shards_number > 1:
+            self.voc = [word for word in self.voc if self._in_shard_(word, self.shard_index, self.shards_number)]
+            self.logger_info.info("Shard {} of {}: {} words".format(self.shard_index, self.shards_number,
+                                                                    len(self.voc)))
+
         self.logger_info.info("Vocabulary preparation is complete")
         return None
 
-    def run_and_save(self, top_n: int):
-        """Performs word sense induction and saves results to a file."""
+    def _request_stop_(self, signum, frame):
+        self.logger_info.info("Signal {} received, stopping after the current word".format(signum))
+        self.stop_requested = True
+
+    def get_inventory_file(self, top_n: int) -> str:
+        """Name of the inventory file; a shard writes its own file, see merge_inventories.py."""
+        if self.shards_number > 1:
+            return "cc.{}.300.vec.gz.top{}.shard{}of{}.inventory.tsv".format(self.language, top_n,
+                                                                            self.shard_index, self.shards_number)
+        return "cc.{}.300.vec.gz.top{}.inventory.tsv".format(self.language, top_n)
 
-        words = {w: None for w in self.voc}
+    def run_and_save(self, top_n: int, resume: bool = False, checkpoint_every: int = 1000,
+                     compress: bool = False, binary: bool = False, flush_size: int = 1 << 20,
+                     flush_seconds: float = 10.0):
+        """
+        Performs word sense induction and saves results to a file.
+        The inventory is written to a .part file and checkpointed every checkpoint_every words;
+        it is renamed to the final name only when all the words are processed.
+        In the sharded mode only the words of the shard are processed.
+        :param top_n: number of neighbors
+        :param resume: continue from the last checkpoint instead of starting over
+        :param checkpoint_every: number of words between checkpoints
+        :param compress: gzip the inventory
+        :param binary: also write the inventory in the binary format used by the disambiguator
+        :param flush_size: number of buffered characters that triggers a write
+        :param flush_seconds: maximum number of seconds between writes
+        """
 
         if self.visualize:
             plt_topn_path = os.path.join(self.plt_path, str(top_n))
@@ -360,41 +453,112 @@ class GraphInductor(object):
 
         self.logger_info.info("{} neighbors".format(top_n))
 
-        inventory_file = "cc.{}.300.vec.gz.top{}.inventory.tsv".format(self.language, top_n)
+        inventory_file = self.get_inventory_file(top_n)
         output_fpath = os.path.join(self.inventory_path, inventory_file)
+        if compress:
+            output_fpath += ".gz"
+        part_fpath = output_fpath + ".part"
+        checkpoint_fpath = output_fpath + ".checkpoint.json"
+
+        parameters = {"language": self.language, "emb_limit": self.emb_limit, "filter_voc": self.filter_voc,
+                      "inv_limit": self.inv_limit, "words": len(self.voc), "top_n": top_n,
+                      "cw": self.chinese_whispers_n, "seed": self.seed, "compress": compress,
+                      "shard": [self.shard_index, self.shards_number]}
+
+        checkpoint = self._load_checkpoint_(checkpoint_fpath) if resume else {}
+        self._check_resume_parameters_(checkpoint, parameters, checkpoint_fpath)
+        if checkpoint and os.path.exists(part_fpath):
+            # drop whatever was written after the last checkpoint
+            with open(part_fpath, "r+b") as out:
+                out.truncate(checkpoint["offset"])
+            start_index = checkpoint["done"]
+            self.logger_info.info("Resuming from word {} of {}".format(start_index + 1, len(self.voc)))
+            writer = InventoryWriter(part_fpath, compress=compress, append=True,
+                                     flush_size=flush_size, flush_seconds=flush_seconds)
+        else:
+            start_index = 0
+            writer = InventoryWriter(part_fpath, compress=compress,
+                                     flush_size=flush_size, flush_seconds=flush_seconds)
+            writer.write(["word\tcid\tkeyword\tcluster\n"])
+
+        # Ctrl+C and SIGTERM stop the run between words, so that no word is written partially
+        self.stop_requested = False
+        previous_handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous_handlers[signum] = signal.signal(signum, self._request_stop_)
+
+        interrupted = False
+        done = start_index
+        with writer:
+            for index, word in enumerate(self.voc[start_index:], start=start_index):
+
+                if self.stop_requested:
+                    interrupted = True
+                    break
+
+                if (index - start_index) % checkpoint_every == 0 and index > start_index:
+                    self._save_checkpoint_(checkpoint_fpath, {"parameters": parameters, "done": done,
+                                                              "offset": writer.checkpoint()})
 
-        with codecs.open(output_fpath, "w", "utf-8") as out:
-            out.write("word\tcid\tkeyword\tcluster\n")
+                self.logger_info.info("{} neighbors, word {} of {}".format(top_n, index + 1, len(self.voc)))
 
-        for index, word in enumerate(words):
+                if self.visualize:
+                    plt_topn_path_word = os.path.join(plt_topn_path, "{}.json".format(word))
+
+                try:
+                    result = self._wsi_(word, neighbors_number=top_n)
+                    if self.visualize:
+                        self._save_ego_(result["network"], plt_topn_path_word)
+                    writer.write(self._get_cluster_lines_(result["network"], result["nodes"]))
+
+                except:
+                    print("Error:", word)
+                    print(format_exc())
+                    self.logger_error.error("{} neighbors, {}: {}".format(top_n, word, format_exc()))
+                done = index + 1
+
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+            if interrupted:
+                self._save_checkpoint_(checkpoint_fpath, {"parameters": parameters, "done": done,
+                                                          "offset": writer.checkpoint()})
+                self.logger_info.info("Interrupted at word {}, run with -resume to continue".format(done + 1))
+                return None
+
+        os.replace(part_fpath, output_fpath)
+        if os.path.exists(checkpoint_fpath):
+            os.remove(checkpoint_fpath)
+        self.logger_info.info("Inventory saved at {}".format(output_fpath))
+
+        if binary:
+            binary_fpath = os.path.join(self.inventory_path, inventory_file[:-len(".tsv")] + ".bin")
+            write_binary_inventory(output_fpath, binary_fpath)
+            self.logger_info.info("Binary inventory saved at {}".format(binary_fpath))
+        return None
 
-            self.logger_info.info("{} neighbors, word {} of {}".format(top_n, index + 1, len(words)))
 
-            if self.visualize:
-                plt_topn_path_word = os.path.join(plt_topn_path, "{}.pdf".format(word))
+def _terminate_(signum, frame):
+    """Handles SIGTERM (e.g. preemption of a cluster job) like Ctrl+C, so that a checkpoint is saved."""
+    raise KeyboardInterrupt
 
-            try:
-                words[word] = self._wsi_(word, neighbors_number=top_n)
-                if self.visualize:
-                    self._draw_ego_(words[word]["network"], plt_topn_path_word)
-                lines = self._get_cluster_lines_(words[word]["network"], words[word]["nodes"])
-                with codecs.open(output_fpath, "a", "utf-8") as out:
-                    for line in lines:
-                        out.write(line)
 
-            except KeyboardInterrupt:
-                break
-            except:
-                print("Error:", word)
-                print(format_exc())
-                self.logger_error.error("{} neighbors, {}: {}".format(top_n, word, format_exc()))
-        return None
+def _parse_shard_(value: str) -> Tuple[int, int]:
+    """Parses the shard argument 'i/N' into (i, N)."""
+    try:
+        shard_index, shards_number = [int(part) for part in value.split("/")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard should look like i/N, e.g. 0/4, got {}".format(value))
+    if not 0 <= shard_index < shards_number:
+        raise argparse.ArgumentTypeError("shard index should be in [0, {}), got {}".format(shards_number, shard_index))
+    return shard_index, shards_number
 
 
 def main():
     parser = argparse.ArgumentParser(description='Graph-Vector Word Sense Induction approach.')
     parser.add_argument("language", help="A code that represents input language, e.g. 'en', 'de' or 'ru'. ")
-    parser.add_argument("-viz", help="Visualize each ego networks.", action="store_true")
+    parser.add_argument("-viz", help="Save each ego network for visualization.", action="store_true")
     parser.add_argument("-gpu", help="Use GPU for faiss", action="store_true")
     parser.add_argument("-filter_voc", help="Filter vocabulary by digits and punctuation", action="store_true")
     parser.add_argument("-gpu_device", help="Which GPU to use", type=int, default=0)
@@ -403,8 +567,23 @@ def main():
     parser.add_argument("-inv_limit", help="Inventory vocabulary size", type=int, default=100000)
     parser.add_argument("-emb_limit", help="Initial embedding vocabulary size", type=int, default=1000000)
     parser.add_argument("-cw", help="Number of Chinese Whispers iterations", type=int, default=20)
+    parser.add_argument("-seed", help="Random seed for Chinese Whispers", type=int, default=0)
+    parser.add_argument("-resume", help="Resume an interrupted run from its checkpoints", action="store_true")
+    parser.add_argument("-checkpoint_every", help="Number of words between checkpoints", type=int, default=1000)
+    parser.add_argument("-compress", help="Write a gzipped inventory (.tsv.gz)", action="store_true")
+    parser.add_argument("-binary", help="Also write a binary inventory for the disambiguator", action="store_true")
+    parser.add_argument("-flush_size", help="Number of buffered characters before a write", type=int,
+                        default=1 << 20)
+    parser.add_argument("-flush_seconds", help="Maximum number of seconds between writes", type=float, default=10.)
+    parser.add_argument("-shard", help="Process only the shard i of N of the vocabulary, e.g. 0/4; "
+                                       "combine the shards with merge_inventories.py", type=_parse_shard_,
+                        default=(0, 1))
+    parser.add_argument("-neighbors_only", help="Only compute the neighbors table, e.g. before running the shards",
+                        action="store_true")
 
     args = parser.parse_args()
+    signal.signal(signal.SIGTERM, _terminate_)
+
     graph_inductor = GraphInductor(language=args.language,
                                    faiss_gpu=args.gpu,
                                    gpu_device=args.gpu_device,
@@ -412,9 +591,19 @@ def main():
                                    batch_size=args.batch_size,
                                    inv_limit=args.inv_limit,
                                    emb_limit=args.emb_limit,
-                                   visualize=args.viz)
-    graph_inductor.prepare_vocabulary(args.top_n, args.filter_voc)
-    graph_inductor.run_and_save(args.top_n)
+                                   visualize=args.viz,
+                                   seed=args.seed,
+                                   shard=args.shard)
+    graph_inductor.prepare_vocabulary(args.top_n, args.filter_voc, resume=args.resume)
+    if args.neighbors_only:
+        return
+    graph_inductor.run_and_save(args.top_n,
+                                resume=args.resume,
+                                checkpoint_every=args.checkpoint_every,
+                                compress=args.compress,
+                                binary=args.binary,
+                                flush_size=args.flush_size,
+                                flush_seconds=args.flush_seconds)
 
 
 if __name__ == '__main__':
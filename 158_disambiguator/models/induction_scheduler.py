@@ -0,0 +1,206 @@
+import os
+import sys
+import gzip
+import json
+import logging
+import argparse
+import subprocess
+from time import time, sleep
+from typing import Dict, List
+
+os.makedirs("logs", exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("logs/induction_scheduler.log"),
+        logging.StreamHandler()
+    ]
+)
+
+FASTTEXT_PATH = "./fasttext_models/{lang}/cc.{lang}.300.vec.gz"
+INDUCTION_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "graph_induction.py")
+VECTOR_SIZE = 300
+VECTOR_COPIES = 1  # gensim reads the vectors from the faiss index storage
+VOCAB_ENTRY_BYTES = 500  # gensim vocabulary object, word string and dict entry
+OVERHEAD = 1.2
+
+
+def get_vocabulary_size(language: str, emb_limit: int) -> int:
+    """Reads the vocabulary size from the header of the .vec.gz file, emb_limit if there is no file yet."""
+    wv_fpath = FASTTEXT_PATH.format(lang=language)
+    if not os.path.exists(wv_fpath):
+        return emb_limit
+    with gzip.open(wv_fpath, "rt", encoding="utf-8", errors="ignore") as f:
+        vocabulary_size = int(f.readline().split()[0])
+    return min(vocabulary_size, emb_limit)
+
+
+def estimate_memory(vocabulary_size: int, top_n: int) -> int:
+    """Estimates peak memory of graph_induction for a language in bytes."""
+    vectors = VECTOR_COPIES * vocabulary_size * VECTOR_SIZE * 4
+    vocabulary = vocabulary_size * VOCAB_ENTRY_BYTES
+    neighbors = vocabulary_size * top_n * (4 + 4)  # int32 indices and float32 distances
+    return int(OVERHEAD * (vectors + vocabulary + neighbors))
+
+
+def read_progress(language: str, top_n: int) -> str:
+    """Reads the number of processed words from the inventory checkpoint of a running language."""
+    inventory_path = os.path.join("inventories", language)
+    for suffix in ("", ".gz"):
+        checkpoint_fpath = os.path.join(inventory_path, "cc.{}.300.vec.gz.top{}.inventory.tsv{}.checkpoint.json".format(
+            language, top_n, suffix))
+        if os.path.exists(checkpoint_fpath):
+            try:
+                with open(checkpoint_fpath) as f:
+                    checkpoint = json.load(f)
+                return "{} of {} words".format(checkpoint["done"], checkpoint["parameters"]["words"])
+            except (ValueError, KeyError):
+                break
+    return "preparing"
+
+
+class Job(object):
+    def __init__(self, language: str, memory: int, cores: int):
+        self.language = language
+        self.memory = memory
+        self.cores = cores
+        self.process = None
+        self.status = "pending"
+        self.start = None
+        self.end = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.start is None:
+            return 0.
+        return (self.end or time()) - self.start
+
+
+class InductionScheduler(object):
+    """
+    Runs graph_induction.py for many languages as separate processes. A language is started
+    when its estimated memory fits into the free RAM budget and there are free cores;
+    the largest languages are started first.
+    """
+
+    def __init__(self, languages: List[str], memory_budget: int, cores_budget: int, cores_per_job: int,
+                 top_n: int, emb_limit: int, induction_args: List[str], poll_seconds: float = 10.,
+                 status_seconds: float = 300.):
+        self.memory_budget = memory_budget
+        self.cores_budget = cores_budget
+        self.top_n = top_n
+        self.induction_args = induction_args
+        self.poll_seconds = poll_seconds
+        self.status_seconds = status_seconds
+
+        self.jobs = []
+        for language in languages:
+            vocabulary_size = get_vocabulary_size(language, emb_limit)
+            memory = estimate_memory(vocabulary_size, top_n)
+            logging.info("{}: {} words, estimated memory {:.1f} GB".format(language, vocabulary_size, memory / 2 ** 30))
+            if memory > memory_budget:
+                logging.warning("{}: estimated memory exceeds the budget, it will run alone".format(language))
+            self.jobs.append(Job(language, memory, min(cores_per_job, cores_budget)))
+        self.jobs.sort(key=lambda job: job.memory, reverse=True)
+
+    def _running(self) -> List[Job]:
+        return [job for job in self.jobs if job.status == "running"]
+
+    def _start(self, job: Job):
+        env = dict(os.environ, OMP_NUM_THREADS=str(job.cores))
+        command = [sys.executable, INDUCTION_SCRIPT, job.language, "-top_n", str(self.top_n)] + self.induction_args
+        log_fpath = os.path.join("logs", "induction_{}.log".format(job.language))
+        with open(log_fpath, "ab") as log:
+            job.process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+        job.status = "running"
+        job.start = time()
+        logging.info("{}: started, log in {}".format(job.language, log_fpath))
+
+    def _fits(self, job: Job) -> bool:
+        running = self._running()
+        if not running:
+            return True  # a language larger than the budget still runs, alone
+        free_memory = self.memory_budget - sum(j.memory for j in running)
+        free_cores = self.cores_budget - sum(j.cores for j in running)
+        return job.memory <= free_memory and job.cores <= free_cores
+
+    def _poll(self):
+        for job in self._running():
+            returncode = job.process.poll()
+            if returncode is not None:
+                job.end = time()
+                job.status = "done" if returncode == 0 else "failed ({})".format(returncode)
+                logging.info("{}: {} in {:.0f} sec.".format(job.language, job.status, job.elapsed))
+
+    def _log_status(self):
+        for job in self._running():
+            logging.info("{}: running {:.0f} sec., {}".format(job.language, job.elapsed,
+                                                              read_progress(job.language, self.top_n)))
+        statuses = [job.status for job in self.jobs]
+        logging.info("pending {}, running {}, finished {} of {}".format(
+            statuses.count("pending"), statuses.count("running"),
+            len(statuses) - statuses.count("pending") - statuses.count("running"), len(statuses)))
+
+    def run(self):
+        last_status = time()
+        try:
+            while any(job.status in ("pending", "running") for job in self.jobs):
+                self._poll()
+                for job in self.jobs:
+                    if job.status == "pending" and self._fits(job):
+                        self._start(job)
+                if time() - last_status >= self.status_seconds:
+                    self._log_status()
+                    last_status = time()
+                sleep(self.poll_seconds)
+        except KeyboardInterrupt:
+            # graph_induction saves a checkpoint on SIGTERM
+            for job in self._running():
+                job.process.terminate()
+            for job in self._running():
+                job.process.wait()
+                job.end = time()
+                job.status = "interrupted"
+        return self.summary()
+
+    def summary(self) -> List[Dict]:
+        return [{"language": job.language,
+                 "status": job.status,
+                 "memory_gb": round(job.memory / 2 ** 30, 2),
+                 "seconds": round(job.elapsed, 1)} for job in self.jobs]
+
+
+def save_summary(summary: List[Dict], summary_fpath: str):
+    with open(summary_fpath, "w") as out:
+        out.write("language\tstatus\tmemory_gb\tseconds\n")
+        for row in summary:
+            out.write("{language}\t{status}\t{memory_gb}\t{seconds}\n".format(**row))
+    logging.info("Summary saved at {}".format(summary_fpath))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs graph induction for many languages in parallel. '
+                                                 'Unknown arguments are passed to graph_induction.py.')
+    parser.add_argument("languages", nargs="+", help="Language codes, e.g. 'en de ru'.")
+    parser.add_argument("-memory_gb", help="RAM budget for all the languages", type=float, default=64.)
+    parser.add_argument("-cores", help="Cores budget for all the languages", type=int, default=os.cpu_count())
+    parser.add_argument("-cores_per_job", help="Cores (faiss threads) per language", type=int, default=4)
+    parser.add_argument("-top_n", help="Number of neighbors", type=int, default=200)
+    parser.add_argument("-emb_limit", help="Initial embedding vocabulary size", type=int, default=1000000)
+    parser.add_argument("-summary", help="Path of the timings summary", default="logs/induction_summary.tsv")
+    args, induction_args = parser.parse_known_args()
+
+    scheduler = InductionScheduler(languages=args.languages,
+                                   memory_budget=int(args.memory_gb * 2 ** 30),
+                                   cores_budget=args.cores,
+                                   cores_per_job=args.cores_per_job,
+                                   top_n=args.top_n,
+                                   emb_limit=args.emb_limit,
+                                   induction_args=["-emb_limit", str(args.emb_limit)] + induction_args)
+    summary = scheduler.run()
+    save_summary(summary, args.summary)
+
+
+if __name__ == '__main__':
+    main()
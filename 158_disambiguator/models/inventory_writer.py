@@ -0,0 +1,66 @@
+import os
+import gzip
+from time import time
+from typing import List
+
+
+class InventoryWriter(object):
+    """
+    Long-lived writer for inventory lines. Lines are buffered and written in batches,
+    either when the buffer exceeds flush_size characters or flush_seconds have passed.
+    With compress=True the output is gzipped; every checkpoint closes a gzip member,
+    so the file can be safely truncated to a checkpoint offset and appended to.
+    """
+
+    def __init__(self, fpath: str, compress: bool = False, append: bool = False,
+                 flush_size: int = 1 << 20, flush_seconds: float = 10.0):
+        self.fpath = fpath
+        self.compress = compress
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+
+        self._raw = open(fpath, "ab" if append else "wb")
+        self._stream = None
+        self._buffer = []
+        self._buffer_size = 0
+        self._last_flush = time()
+
+    def write(self, lines: List[str]):
+        """Adds lines to the buffer and flushes it according to the flush policy."""
+        self._buffer.extend(lines)
+        self._buffer_size += sum(len(line) for line in lines)
+        if self._buffer_size >= self.flush_size or time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered lines to the file."""
+        if self._buffer:
+            if self._stream is None:
+                self._stream = gzip.GzipFile(fileobj=self._raw, mode="ab") if self.compress else self._raw
+            self._stream.write("".join(self._buffer).encode("utf-8"))
+        self._buffer = []
+        self._buffer_size = 0
+        self._last_flush = time()
+
+    def checkpoint(self) -> int:
+        """
+        Flushes everything to disk.
+        :return: file offset up to which the file is complete
+        """
+        self.flush()
+        if self.compress and self._stream is not None:
+            self._stream.close()  # ends the gzip member, the raw file stays open
+            self._stream = None
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        return self._raw.tell()
+
+    def close(self):
+        self.checkpoint()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
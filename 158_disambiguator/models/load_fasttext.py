@@ -1,21 +1,124 @@
 import os
-import requests
+import hashlib
 import logging
-from clint.textui import progress
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
 
 os.makedirs("logs", exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
+    format="%(asctime)s [%(levelname)s] %(threadName)s %(message)s",
     handlers=[
         logging.FileHandler("logs/load_fasttext.log"),
         logging.StreamHandler()
     ]
 )
 
+FASTTEXT_URI = "https://dl.fbaipublicfiles.com/fasttext/vectors-crawl/cc.{lang}.300.vec.gz"
+CHUNK_SIZE = 1 << 22
+RETRIES = 5
+TIMEOUT = 60
+
+
+def file_md5(fpath: str, block_size: int = 1 << 24) -> str:
+    md5 = hashlib.md5()
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def get_remote_size(uri: str, session: requests.Session = None) -> int:
+    """Returns the size of the remote file from a HEAD request, None if the server does not tell it."""
+    response = (session or requests).head(uri, allow_redirects=True, timeout=TIMEOUT)
+    response.raise_for_status()
+    size = response.headers.get("content-length")
+    return int(size) if size is not None else None
+
+
+def _download_part(uri: str, part_fpath: str, session: requests.Session, chunk_size: int) -> int:
+    """
+    Downloads the rest of the file into part_fpath, continuing after its current size with a Range request.
+    :return: expected size of the whole file, None if unknown
+    """
+    offset = os.path.getsize(part_fpath) if os.path.exists(part_fpath) else 0
+    headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+
+    with session.get(uri, headers=headers, stream=True, timeout=TIMEOUT) as r:
+        if r.status_code == 416:  # nothing left after the offset, the size is checked by the caller
+            content_range = r.headers.get("content-range", "")
+            return int(content_range.rsplit("/", 1)[1]) if "/" in content_range else offset
+        r.raise_for_status()
+
+        if r.status_code == 206:
+            total_size = int(r.headers["content-range"].rsplit("/", 1)[1])
+            mode = "ab"
+        else:  # the server ignored the range, start over
+            offset = 0
+            total_size = r.headers.get("content-length")
+            total_size = int(total_size) if total_size is not None else None
+            mode = "wb"
+
+        if offset:
+            logging.info("Resuming {} from {} of {} bytes".format(uri, offset, total_size))
+        next_report = 0.
+        with open(part_fpath, mode, buffering=chunk_size) as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                offset += len(chunk)
+                if total_size and offset / total_size >= next_report:
+                    logging.info("{}: {:.0%} of {} MB".format(os.path.basename(part_fpath), offset / total_size,
+                                                             total_size >> 20))
+                    next_report += 0.1
+    return total_size
+
 
-def download_word_embeddings(language):
-    """ Ensures that the word vectors exist by downloading them if needed. """
+def download_file(uri: str, fpath: str, expected_size: int = None, expected_md5: str = None,
+                  session: requests.Session = None, chunk_size: int = CHUNK_SIZE, retries: int = RETRIES) -> str:
+    """
+    Downloads a file into fpath + ".part" and renames it to fpath only when it is complete, so that
+    an interrupted download is never taken for a finished one. A partial file left by an earlier
+    run or a dropped connection is resumed with an HTTP Range request.
+    :param uri: address of the file
+    :param fpath: path of the downloaded file
+    :param expected_size: size in bytes to check, the size announced by the server by default
+    :param expected_md5: MD5 checksum to check, if known
+    :param session: requests session, one per thread
+    :param chunk_size: size of the streamed chunks and of the write buffer
+    :param retries: number of attempts to continue after a failed transfer
+    :return: fpath
+    """
+    session = session or requests.Session()
+    part_fpath = fpath + ".part"
+
+    for attempt in range(retries + 1):
+        try:
+            total_size = _download_part(uri, part_fpath, session, chunk_size)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == retries:
+                raise
+            logging.warning("Download of {} failed ({}), retrying".format(uri, e))
+
+    size = os.path.getsize(part_fpath)
+    expected_size = expected_size or total_size
+    if expected_size is not None and size != expected_size:
+        raise IOError("{}: downloaded {} bytes, expected {}".format(uri, size, expected_size))
+    if expected_md5 is not None and file_md5(part_fpath) != expected_md5:
+        os.remove(part_fpath)  # a corrupted file cannot be resumed
+        raise IOError("{}: checksum mismatch".format(uri))
+
+    os.replace(part_fpath, fpath)
+    return fpath
+
+
+def download_word_embeddings(language, base_uri: str = FASTTEXT_URI, verify: bool = False,
+                             session: requests.Session = None):
+    """ Ensures that the word vectors exist by downloading them if needed.
+    :param verify: compare the size of an existing file with the remote one and resume it if it is truncated """
 
     dir_path = os.path.join("fasttext_models", language)
     os.makedirs(dir_path, exist_ok=True)
@@ -23,25 +126,54 @@ def download_word_embeddings(language):
     filename = "cc.{}.300.vec.gz".format(language)
     wv_fpath = os.path.join(dir_path, filename)
     wv_pkl_fpath = wv_fpath + ".pkl"
+    wv_uri = base_uri.format(lang=language)
+
+    if os.path.exists(wv_fpath) and verify:
+        remote_size = get_remote_size(wv_uri, session)
+        if remote_size is not None and os.path.getsize(wv_fpath) < remote_size:
+            logging.warning("File for {} is truncated, resuming the download".format(language))
+            os.replace(wv_fpath, wv_fpath + ".part")
 
     if os.path.exists(wv_fpath):
         logging.info('File for {lang} already exists'.format(lang=language))
     else:
-        wv_uri = "https://dl.fbaipublicfiles.com/fasttext/vectors-crawl/cc.{}.300.vec.gz".format(language)
-
         logging.info("Downloading the fasttext model from {}".format(wv_uri))
-
-        r = requests.get(wv_uri, stream=True)
-        with open(wv_fpath, "wb") as f:
-            total_length = int(r.headers.get("content-length"))
-            for chunk in progress.bar(r.iter_content(chunk_size=1024), expected_size=(total_length / 1024) + 1):
-                if chunk:
-                    f.write(chunk)
-                    f.flush()
+        download_file(wv_uri, wv_fpath, session=session)
+        logging.info("Downloaded {}".format(wv_fpath))
     return wv_fpath, wv_pkl_fpath
 
 
+def download_all(languages: List[str], workers: int = 4, base_uri: str = FASTTEXT_URI,
+                 verify: bool = False) -> Dict[str, str]:
+    """
+    Downloads the vectors of many languages with at most workers transfers at a time.
+    :return: dict of languages that failed and their errors
+    """
+    def download(language):
+        with requests.Session() as session:
+            download_word_embeddings(language, base_uri=base_uri, verify=verify, session=session)
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as executor:
+        futures = {language: executor.submit(download, language) for language in languages}
+        for language, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logging.error("{}: {}".format(language, e))
+                errors[language] = str(e)
+    return errors
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Downloads fastText vectors of many languages in parallel.')
+    parser.add_argument("languages", nargs="*", help="Language codes, all the 158 languages by default.")
+    parser.add_argument("-workers", help="Number of concurrent downloads", type=int, default=4)
+    parser.add_argument("-verify", help="Check the size of existing files and resume truncated ones",
+                        action="store_true")
+    parser.add_argument("-uri", help="Address template of the files", default=FASTTEXT_URI)
+    args = parser.parse_args()
+
     lang_list = ['af', 'als', 'am', 'an', 'ar', 'arz', 'as',
                  'ast', 'az', 'azb', 'ba', 'bar', 'bcl', 'be',
                  'bg', 'bh', 'bn', 'bo', 'bpy', 'br', 'bs',
@@ -65,9 +197,10 @@ def main():
                  'tr', 'tt', 'ug', 'uk', 'ur', 'uz', 'vec',
                  'vi', 'vls', 'vo', 'wa', 'war', 'xmf', 'yi',
                  'yo', 'zea', 'zh', 'ko']
-    for lang in lang_list:
-        logging.info(lang)
-        download_word_embeddings(language=lang)
+    errors = download_all(args.languages or lang_list, workers=args.workers, base_uri=args.uri, verify=args.verify)
+    if errors:
+        logging.error("Failed: {}".format(", ".join(sorted(errors))))
+        exit(1)
 
 
 if __name__ == '__main__':
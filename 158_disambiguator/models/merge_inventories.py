@@ -0,0 +1,86 @@
+import os
+import sys
+import logging
+import argparse
+from typing import Dict, Iterator, List, Tuple
+
+from inventory_writer import InventoryWriter
+
+# the binary inventory format is shared with the disambiguator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from binary_inventory import open_inventory, write_binary_inventory  # noqa: E402
+
+logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
+
+HEADER = "word\tcid\tkeyword\tcluster\n"
+
+
+def read_inventory(fpath: str) -> Iterator[str]:
+    """Reads the lines of a plain or gzipped (.gz) inventory without its header."""
+    with open_inventory(fpath) as f:
+        for line in f:
+            if line == HEADER or not line.strip():
+                continue
+            yield line if line.endswith("\n") else line + "\n"
+
+
+def merge_inventories(input_fpaths: List[str], output_fpath: str, compress: bool = False) -> Tuple[int, int]:
+    """
+    Merges shard inventories into one inventory sorted by word and cluster id.
+    A sense (word, cid) given by several shards, e.g. when a shard was run twice, is written once.
+    The output is written to a .part file and renamed when it is complete.
+    :param input_fpaths: shard inventories, plain or gzipped
+    :param output_fpath: merged inventory
+    :param compress: gzip the merged inventory
+    :return: numbers of written and dropped duplicate senses
+    """
+    senses: Dict[Tuple[str, int], str] = dict()
+    duplicates = 0
+    for fpath in input_fpaths:
+        logging.info("Reading {}".format(fpath))
+        for line in read_inventory(fpath):
+            fields = line.split("\t", 2)
+            try:
+                key = (fields[0], int(fields[1]))
+            except (IndexError, ValueError):
+                logging.error("Skipping a broken line in {}: {}".format(fpath, line.strip()))
+                continue
+            if key in senses:
+                duplicates += 1
+                continue
+            senses[key] = line
+
+    part_fpath = output_fpath + ".part"
+    with InventoryWriter(part_fpath, compress=compress) as writer:
+        writer.write([HEADER])
+        for key in sorted(senses):
+            writer.write([senses[key]])
+    os.replace(part_fpath, output_fpath)
+    return len(senses), duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merges the inventories of graph_induction.py -shard i/N runs '
+                                                 'into one sorted inventory without duplicates.')
+    parser.add_argument("inputs", nargs="+", help="Shard inventories (.tsv or .tsv.gz)")
+    parser.add_argument("-output", help="Path of the merged inventory, gzipped if it ends with .gz", required=True)
+    parser.add_argument("-binary", help="Also write a binary inventory for the disambiguator", action="store_true")
+    args = parser.parse_args()
+
+    missing = [fpath for fpath in args.inputs if not os.path.exists(fpath)]
+    if missing:
+        logging.error("Missing shard inventories: {}".format(", ".join(missing)))
+        exit(1)
+
+    written, duplicates = merge_inventories(args.inputs, args.output, compress=args.output.endswith(".gz"))
+    logging.info("Merged {} senses ({} duplicates dropped) into {}".format(written, duplicates, args.output))
+
+    if args.binary:
+        binary_fpath = args.output[:-len(".gz")] if args.output.endswith(".gz") else args.output
+        binary_fpath = (binary_fpath[:-len(".tsv")] if binary_fpath.endswith(".tsv") else binary_fpath) + ".bin"
+        write_binary_inventory(args.output, binary_fpath)
+        logging.info("Binary inventory saved at {}".format(binary_fpath))
+
+
+if __name__ == '__main__':
+    main()
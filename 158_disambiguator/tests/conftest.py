@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the services and the model scripts import their modules by name, as when they are run from their directories
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'models'))
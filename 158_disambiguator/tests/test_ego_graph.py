@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from ego_graph import EgoGraph
+
+
+def planted_graph(nodes_number=200, groups=6, degree=60, seed=1):
+    """Random graph with strong edges inside planted groups and weak edges between them."""
+    rng = np.random.RandomState(seed)
+    group = rng.randint(groups, size=nodes_number)
+    src, dst, weights = [], [], []
+    for i in range(nodes_number):
+        for j in rng.choice(nodes_number, degree, replace=False):
+            if group[i] == group[j]:
+                src.append(i), dst.append(j), weights.append(rng.uniform(0.5, 0.8))
+            elif rng.rand() < 0.05:
+                src.append(i), dst.append(j), weights.append(rng.uniform(0.2, 0.4))
+    return group, np.array(src), np.array(dst), np.array(weights)
+
+
+def pairs_agreement(labels_a, labels_b):
+    """Share of node pairs on which two clusterings agree (Rand index)."""
+    same_a = np.equal.outer(labels_a, labels_a)
+    same_b = np.equal.outer(labels_b, labels_b)
+    upper = np.triu_indices(len(labels_a), k=1)
+    return float((same_a == same_b)[upper].mean())
+
+
+def test_from_edges_keeps_last_weight_and_drops_self_loops():
+    graph = EgoGraph.from_edges("ego", ["a", "b", "c"], [1, 1, 1],
+                                src=[0, 1, 2, 0], dst=[1, 0, 2, 2], weights=[0.1, 0.5, 0.9, 0.3])
+    assert graph.edges_number == 2
+    assert graph.neighbors(0).tolist() == [1, 2]
+    assert graph.weights[graph.indptr[0]:graph.indptr[1]].tolist() == pytest.approx([0.5, 0.3])
+    assert graph.neighbors(2).tolist() == [0]
+
+
+def test_chinese_whispers_finds_planted_groups():
+    agreement = []
+    for seed in range(5):
+        group, src, dst, weights = planted_graph(seed=seed)
+        nodes = [str(i) for i in range(len(group))]
+        graph = EgoGraph.from_edges("ego", nodes, [1] * len(nodes), src, dst, weights)
+        agreement.append(pairs_agreement(graph.chinese_whispers(iterations=20, seed=seed), group))
+    assert np.mean(agreement) > 0.99
+
+
+def test_chinese_whispers_agrees_with_package():
+    """The CSR clustering replaced the chinese_whispers package, see requirements-dev.txt."""
+    nx = pytest.importorskip("networkx")
+    chinese_whispers = pytest.importorskip("chinese_whispers").chinese_whispers
+
+    agreement = []
+    for seed in range(5):
+        group, src, dst, weights = planted_graph(seed=seed)
+        nodes = [str(i) for i in range(len(group))]
+
+        graph = nx.Graph()
+        graph.add_nodes_from(nodes)
+        graph.add_edges_from([(nodes[i], nodes[j], {'weight': w}) for i, j, w in zip(src, dst, weights) if i != j])
+        chinese_whispers(graph, weighting="top", iterations=20, seed=seed)
+        labels_package = np.array([graph.nodes[node]['label'] for node in nodes])
+
+        ego_graph = EgoGraph.from_edges("ego", nodes, [1] * len(nodes), src, dst, weights)
+        labels_csr = ego_graph.chinese_whispers(iterations=20, seed=seed)
+        agreement.append(pairs_agreement(labels_package, labels_csr))
+    assert np.mean(agreement) > 0.99
@@ -0,0 +1,97 @@
+import gzip
+import os
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import vector_cache
+
+VECTORS = [("a", [3., 4.]), ("b", [0., 2.]), ("a", [1., 0.]), ("c", [1., 1.]), ("b", [5., 5.])]
+
+
+def write_vec(fpath, rows=VECTORS):
+    with gzip.open(fpath, "wt", encoding="utf-8") as out:
+        out.write("{} {}\n".format(len(rows), len(rows[0][1])))
+        for word, vector in rows:
+            out.write("{} {}\n".format(word, " ".join(map(str, vector))))
+
+
+def keep_words_and_vectors(words, vectors):
+    return words, np.array(vectors)
+
+
+@pytest.fixture
+def vec_fpath(tmp_path):
+    fpath = str(tmp_path / "cc.xx.300.vec.gz")
+    write_vec(fpath)
+    return fpath
+
+
+def check_first_of_duplicates(words, vectors):
+    assert words == ["a", "b", "c"]
+    assert vectors.shape == (3, 2)
+    np.testing.assert_allclose(vectors, [[0.6, 0.8], [0., 1.], [2 ** -.5, 2 ** -.5]], rtol=1e-6)
+
+
+@pytest.mark.parametrize("chunk_lines", [1, 2, 10])
+def test_parse_vectors_drops_duplicate_words(vec_fpath, chunk_lines):
+    words, vectors = vector_cache.parse_vectors(vec_fpath, limit=10, workers=1, chunk_lines=chunk_lines)
+    check_first_of_duplicates(words, vectors)
+
+
+def test_parse_vectors_shrinks_npy(vec_fpath, tmp_path):
+    npy_fpath = str(tmp_path / "vectors.npy")
+    words, vectors = vector_cache.parse_vectors(vec_fpath, limit=10, vectors_fpath=npy_fpath, workers=1)
+    check_first_of_duplicates(words, vectors)
+    check_first_of_duplicates(words, np.load(npy_fpath, mmap_mode="r"))
+    assert not [fname for fname in os.listdir(str(tmp_path)) if fname.endswith(".shrunk")]
+
+
+def test_load_vectors_cache(vec_fpath, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_cache, "to_keyed_vectors", keep_words_and_vectors)
+    check_first_of_duplicates(*vector_cache.load_vectors(vec_fpath, limit=10, workers=1))
+    prefix = vector_cache.get_cache_prefix(vec_fpath, 10)
+    assert os.path.exists(prefix + ".words.txt")
+    assert not [fname for fname in os.listdir(str(tmp_path)) if fname.endswith((".tmp", ".shrunk"))]
+
+    # the second time the vectors are memory-mapped from the cache
+    words, vectors = vector_cache.load_vectors(vec_fpath, limit=10, workers=1)
+    check_first_of_duplicates(words, vectors)
+
+
+def _load_in_process(vec_fpath, results):
+    try:
+        words, vectors = vector_cache.load_vectors(vec_fpath, limit=100000, workers=1)
+        results.put((words[:3], len(words), vectors.shape))
+    except Exception as e:
+        results.put(repr(e))
+
+
+def test_concurrent_conversions(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_cache, "to_keyed_vectors", keep_words_and_vectors)
+    rng = np.random.RandomState(0)
+    vec_fpath = str(tmp_path / "cc.yy.300.vec.gz")
+    write_vec(vec_fpath, [("w{}".format(i % 19000), rng.rand(20)) for i in range(20000)])
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [context.Process(target=_load_in_process, args=(vec_fpath, results)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    answers = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join()
+
+    assert answers == [(["w0", "w1", "w2"], 19000, (19000, 20))] * len(processes)
+    assert not [fname for fname in os.listdir(str(tmp_path)) if fname.endswith((".tmp", ".shrunk"))]
+    words, vectors = vector_cache.load_vectors(vec_fpath, limit=100000, workers=1)
+    assert len(words) == len(set(words)) == vectors.shape[0] == 19000
+
+
+def test_keyed_vectors_of_duplicate_words(vec_fpath):
+    pytest.importorskip("gensim")
+    wv = vector_cache.load_vectors(vec_fpath, limit=10, workers=1)
+    assert wv.index2word == ["a", "b", "c"]
+    assert [wv.vocab[word].index for word in wv.index2word] == [0, 1, 2]
+    np.testing.assert_allclose(wv["a"], [0.6, 0.8], rtol=1e-6)
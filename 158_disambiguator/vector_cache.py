@@ -0,0 +1,227 @@
+import os
+import glob
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+from time import time
+from multiprocessing import Pool
+from typing import List, Tuple
+
+import numpy as np
+
+# Binary vectors cache, shared by graph_induction, fasttext_to_psql and egvi:
+#   {vec file}.{checksum}.v{version}.limit{limit}.vectors.npy  L2-normalized float32 matrix, a row per word
+#   {vec file}.{checksum}.v{version}.limit{limit}.words.txt    utf-8 words in the order of the rows
+# The words file is written last, so the cache is complete when it exists.
+CHECKSUM_LENGTH = 16
+CACHE_VERSION = 2  # increase it when the content of the cache changes; 2: duplicate words are dropped
+CHUNK_LINES = 10000
+
+
+def file_checksum(fpath: str, block_size: int = 1 << 24) -> str:
+    """
+    MD5 of the file content. It is remembered in a {file}.md5.json next to the file together with
+    the size and modification time of the file, so a large file is read only once.
+    """
+    stat = os.stat(fpath)
+    memo_fpath = fpath + ".md5.json"
+    try:
+        with open(memo_fpath) as f:
+            memo = json.load(f)
+        if memo["size"] == stat.st_size and memo["mtime"] == stat.st_mtime:
+            return memo["md5"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    md5 = hashlib.md5()
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            md5.update(block)
+    checksum = md5.hexdigest()
+
+    try:
+        with open(memo_fpath, "w") as out:
+            json.dump({"size": stat.st_size, "mtime": stat.st_mtime, "md5": checksum}, out)
+    except OSError:
+        pass  # e.g. a read-only models folder, the checksum is computed again next time
+    return checksum
+
+
+def get_cache_prefix(wv_fpath: str, limit: int) -> str:
+    return "{}.{}.v{}.limit{}".format(wv_fpath, file_checksum(wv_fpath)[:CHECKSUM_LENGTH], CACHE_VERSION, limit)
+
+
+def _parse_chunk(args: Tuple[List[bytes], int]) -> Tuple[List[str], np.ndarray]:
+    """Parses lines of a .vec file into words and L2-normalized vectors, runs in a worker process."""
+    lines, vector_size = args
+    words, values = [], []
+    for line in lines:
+        word, _, rest = line.decode("utf-8", errors="ignore").rstrip().partition(" ")
+        words.append(word)
+        values.append(rest)
+
+    vectors = np.array(" ".join(values).split(), dtype=np.float32)
+    if len(vectors) != len(lines) * vector_size:
+        raise ValueError("Expected {} values per line in a chunk starting with '{}'".format(vector_size, words[0]))
+    vectors = vectors.reshape(len(lines), vector_size)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return words, vectors
+
+
+def _read_chunks(f, rows: int, vector_size: int, chunk_lines: int):
+    chunk = []
+    for _, line in zip(range(rows), f):
+        chunk.append(line)
+        if len(chunk) == chunk_lines:
+            yield chunk, vector_size
+            chunk = []
+    if chunk:
+        yield chunk, vector_size
+
+
+def _shrink_npy(vectors: np.ndarray, vectors_fpath: str, rows: int, chunk_rows: int = 100000) -> np.ndarray:
+    """Replaces the .npy file with one that has only the first rows of the memory-mapped matrix."""
+    shrunk_fpath = vectors_fpath + ".shrunk"
+    try:
+        shrunk = np.lib.format.open_memmap(shrunk_fpath, mode="w+", dtype=vectors.dtype,
+                                           shape=(rows, vectors.shape[1]))
+        for start in range(0, rows, chunk_rows):
+            shrunk[start:start + chunk_rows] = vectors[start:min(start + chunk_rows, rows)]
+        shrunk.flush()
+        del shrunk
+        os.replace(shrunk_fpath, vectors_fpath)
+    except OSError:
+        if os.path.exists(shrunk_fpath):
+            os.remove(shrunk_fpath)
+        raise
+    return np.load(vectors_fpath, mmap_mode="r+")
+
+
+def parse_vectors(wv_fpath: str, limit: int, vectors_fpath: str = None, workers: int = None,
+                  chunk_lines: int = CHUNK_LINES) -> Tuple[List[str], np.ndarray]:
+    """
+    Parses the first limit vectors of a word2vec text file (plain or .gz) and normalizes them.
+    The file is decompressed in this process and the chunks of lines are parsed by a pool of workers.
+    As gensim load_word2vec_format, only the first vector of a duplicate word is kept; decoding with
+    errors="ignore" makes duplicates in the cc.*.vec files.
+    :param wv_fpath: path to the .vec or .vec.gz file
+    :param limit: maximum number of words
+    :param vectors_fpath: if given, the matrix is written to this .npy file instead of memory
+    :param workers: number of parser processes, all the cores by default
+    :param chunk_lines: number of lines sent to a worker at once
+    :return: list of unique words and the matrix of their vectors
+    """
+    open_fn = gzip.open if wv_fpath.endswith(".gz") else open
+    with open_fn(wv_fpath, "rb") as f:
+        vocabulary_size, vector_size = [int(value) for value in f.readline().split()]
+        rows = min(vocabulary_size, limit)
+        if vectors_fpath is None:
+            vectors = np.empty((rows, vector_size), dtype=np.float32)
+        else:
+            vectors = np.lib.format.open_memmap(vectors_fpath, mode="w+", dtype=np.float32,
+                                                shape=(rows, vector_size))
+
+        words = []
+        seen = set()
+        lines_number = 0
+        with Pool(workers) as pool:
+            for chunk_words, chunk_vectors in pool.imap(_parse_chunk, _read_chunks(f, rows, vector_size, chunk_lines)):
+                lines_number += len(chunk_words)
+                keep = []
+                for index, word in enumerate(chunk_words):
+                    if word not in seen:
+                        seen.add(word)
+                        keep.append(index)
+                if len(keep) < len(chunk_words):
+                    chunk_words = [chunk_words[index] for index in keep]
+                    chunk_vectors = chunk_vectors[keep]
+                vectors[len(words):len(words) + len(chunk_words)] = chunk_vectors
+                words.extend(chunk_words)
+
+    if lines_number != rows:
+        raise ValueError("Expected {} vectors in {}, found {}".format(rows, wv_fpath, lines_number))
+    if len(words) < rows:
+        logging.info("Dropped {} vectors of duplicate words in {}".format(rows - len(words), wv_fpath))
+        if vectors_fpath is None:
+            vectors = vectors[:len(words)]
+        else:
+            vectors = _shrink_npy(vectors, vectors_fpath, len(words))
+    if vectors_fpath is not None:
+        vectors.flush()
+    return words, vectors
+
+
+def to_keyed_vectors(words: List[str], vectors: np.ndarray):
+    """Wraps normalized vectors of unique words into gensim KeyedVectors without copying the matrix."""
+    from gensim.models.keyedvectors import KeyedVectors, Vocab
+
+    wv = KeyedVectors(vectors.shape[1])
+    wv.vectors = wv.vectors_norm = vectors
+    wv.index2word = words
+    wv.vocab = {word: Vocab(index=index, count=len(words) - index) for index, word in enumerate(words)}
+    return wv
+
+
+def _temp_fpath(prefix: str, suffix: str) -> str:
+    """A new empty file next to the cache, so that concurrent conversions never write to the same file."""
+    fd, fpath = tempfile.mkstemp(suffix=suffix, prefix=os.path.basename(prefix) + ".",
+                                 dir=os.path.dirname(prefix) or ".")
+    os.close(fd)
+    return fpath
+
+
+def load_vectors(wv_fpath: str, limit: int, workers: int = None):
+    """
+    Loads L2-normalized gensim KeyedVectors. The text file is converted once into a binary cache
+    keyed by its checksum and the limit; the matrix is memory-mapped from the cache afterwards.
+    If the cache cannot be written, the vectors are parsed into memory. Several processes may convert
+    the same file at once, e.g. the shards of an induction; they write to their own temporary files
+    and the cache of the one that finishes first is used.
+    :param wv_fpath: path to the .vec or .vec.gz file
+    :param limit: maximum number of words
+    :param workers: number of parser processes for the conversion
+    :return: gensim KeyedVectors
+    """
+    tic = time()
+    prefix = get_cache_prefix(wv_fpath, limit)
+    vectors_fpath, words_fpath = prefix + ".vectors.npy", prefix + ".words.txt"
+
+    if not os.path.exists(words_fpath):
+        logging.info("Converting {} into a vectors cache".format(wv_fpath))
+        tmp_fpaths = []
+        try:
+            tmp_fpaths.append(_temp_fpath(prefix, ".vectors.npy.tmp"))
+            words, vectors = parse_vectors(wv_fpath, limit, vectors_fpath=tmp_fpaths[0], workers=workers)
+            del vectors
+            tmp_fpaths.append(_temp_fpath(prefix, ".words.txt.tmp"))
+            with open(tmp_fpaths[1], "w", encoding="utf-8", newline="") as out:
+                out.writelines(word + "\n" for word in words)
+            # another process may have finished the same conversion meanwhile, its cache is as good as this one
+            if not os.path.exists(words_fpath):
+                os.replace(tmp_fpaths[0], vectors_fpath)
+                os.replace(tmp_fpaths[1], words_fpath)
+        except OSError as e:
+            logging.warning("Cannot write the vectors cache ({}), loading into memory".format(e))
+            words, vectors = parse_vectors(wv_fpath, limit, workers=workers)
+            logging.info("Loaded {} vectors in {:.1f} sec.".format(len(words), time() - tic))
+            return to_keyed_vectors(words, vectors)
+        finally:
+            for tmp_fpath in tmp_fpaths:
+                if os.path.exists(tmp_fpath):
+                    os.remove(tmp_fpath)
+
+        # caches of older versions of the file are not needed anymore
+        for stale_fpath in glob.glob("{}.*.limit{}.*".format(glob.escape(wv_fpath), limit)):
+            if not stale_fpath.startswith(prefix + "."):
+                try:
+                    os.remove(stale_fpath)
+                except OSError:
+                    pass  # removed by another process
+
+    with open(words_fpath, encoding="utf-8", newline="") as f:
+        words = f.read().split("\n")[:-1]
+    vectors = np.load(vectors_fpath, mmap_mode="r")
+    logging.info("Loaded {} vectors from {} in {:.1f} sec.".format(len(words), vectors_fpath, time() - tic))
+    return to_keyed_vectors(words, vectors)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+"""
+Requests and responses of the services in JSON or MessagePack. A request body is decoded by its Content-Type;
+the response is MessagePack if the client prefers it in the Accept header and JSON otherwise.
+"""
+
+import msgpack
+from flask import Response, request, jsonify
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def _to_builtin(value):
+    # numpy numbers, e.g. confidences computed with numpy
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError('Cannot serialize {}'.format(type(value)))
+
+
+def get_request_data():
+    """Returns the decoded request body or None if it is neither JSON nor MessagePack."""
+    if request.mimetype in MSGPACK_MIMETYPES:
+        return msgpack.unpackb(request.get_data(), raw=False)
+    if request.is_json:
+        return request.get_json()
+    return None
+
+
+def make_response(data):
+    """Encodes the response in the format preferred by the client, JSON by default."""
+    mimetype = request.accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES)
+    if mimetype in MSGPACK_MIMETYPES:
+        return Response(msgpack.packb(data, use_bin_type=True, default=_to_builtin), mimetype=mimetype)
+    return jsonify(data)
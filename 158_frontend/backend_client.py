@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import random
+import asyncio
+
+import aiohttp
+import msgpack
+
+json_headers = {'Content-type': 'application/json'}
+msgpack_headers = {'Content-type': 'application/json', 'Accept': 'application/msgpack, application/json;q=0.5'}
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+# answers of a proxy or an overloaded server that another host may not give
+RETRY_STATUSES = {502, 503, 504}
+
+
+class BackendError(Exception):
+    pass
+
+
+class Backend(object):
+    """One host with its own keep-alive connection pool and its health."""
+
+    def __init__(self, url, connections):
+        self.url = url.rstrip('/')
+        self.connections = connections
+        self._session = None
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0.
+
+    def endpoint(self, path):
+        return self.url + '/' + path if path else self.url
+
+    def session(self):
+        # created lazily in the event loop of the worker that uses it
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.connections)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class BackendPool(object):
+    """
+    Sends JSON requests to a group of equivalent hosts, e.g. all the tokenizers. Every request goes to
+    the host with the fewest outstanding requests. A host that fails (connection error, timeout or
+    a 502/503/504 answer) failures_threshold times in a row is not used for recovery_seconds, after that
+    a single request tries it again (circuit breaking). A failed request is retried on another host.
+    With use_msgpack=True the answers are asked for in MessagePack, which is smaller and faster to decode;
+    hosts that do not support it answer in JSON.
+    The requests are non-blocking: post() is a coroutine and a cancelled request frees its host at once.
+    """
+
+    def __init__(self, urls, timeout=30., retries=2, failures_threshold=3, recovery_seconds=30., connections=10,
+                 use_msgpack=True):
+        self.backends = [Backend(url, connections) for url in urls]
+        self.headers = msgpack_headers if use_msgpack else json_headers
+        self.timeout = timeout
+        self.retries = retries
+        self.failures_threshold = failures_threshold
+        self.recovery_seconds = recovery_seconds
+        # the time spent waiting for a free connection to a busy host does not count
+        self.client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+    # _acquire and _release never await, so they need no lock in the event loop
+
+    def _acquire(self, tried):
+        if not self.backends:
+            return None
+        now = time.time()
+        available = [backend for backend in self.backends if backend.open_until <= now]
+        # a retry prefers another host, the same one is tried again if there are no others
+        candidates = [backend for backend in available if backend not in tried] or available
+        if not candidates:
+            # all the hosts are failing: still try the one that is closest to recovery
+            candidates = [min(self.backends, key=lambda backend: backend.open_until)]
+        least = min(backend.outstanding for backend in candidates)
+        backend = random.choice([backend for backend in candidates if backend.outstanding == least])
+        backend.outstanding += 1
+        if backend.open_until > 0:
+            # half-open: the other requests wait for this one to tell whether the host is back
+            backend.open_until = now + self.recovery_seconds
+        return backend
+
+    def _release(self, backend, failed):
+        backend.outstanding -= 1
+        if failed is None:
+            # the request was cancelled, it tells nothing about the host
+            return
+        if not failed:
+            backend.failures = 0
+            backend.open_until = 0.
+            return
+        backend.failures += 1
+        if backend.failures >= self.failures_threshold:
+            if backend.open_until == 0.:
+                print('Backend', backend.url, 'is failing, not used for', self.recovery_seconds, 'sec.')
+            backend.open_until = time.time() + self.recovery_seconds
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
+
+    async def post(self, path, data, timeout=None):
+        """
+        Posts the data as JSON to the path on one of the hosts and returns the decoded answer.
+        :param path: path of the endpoint, e.g. 'disambiguate'; '' for the root
+        :param data: JSON-serializable request
+        :param timeout: seconds to wait for a host, the pool timeout by default
+        :return: the decoded JSON answer
+        """
+        body = json.dumps(data)
+        client_timeout = self.client_timeout
+        if timeout:
+            client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        tried = set()
+        error = None
+        for _ in range(self.retries + 1):
+            backend = self._acquire(tried)
+            if backend is None:
+                break
+            tried.add(backend)
+            failed = True
+            try:
+                async with backend.session().post(backend.endpoint(path), data=body, headers=self.headers,
+                                                  timeout=client_timeout) as response:
+                    status = response.status
+                    if status in RETRY_STATUSES:
+                        error = BackendError('{} answered {}'.format(backend.endpoint(path), status))
+                        continue
+                    content = await response.read()
+                    content_type = response.content_type
+                failed = False
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = BackendError('{} failed: {!r}'.format(backend.endpoint(path), e))
+                continue
+            except asyncio.CancelledError:
+                failed = None
+                raise
+            finally:
+                self._release(backend, failed)
+
+            if status != 200:
+                # the host works, but cannot process this request, e.g. an unknown language
+                raise BackendError('{} answered {}'.format(backend.endpoint(path), status))
+            if content_type in MSGPACK_MIMETYPES:
+                return msgpack.unpackb(content, raw=False)
+            return json.loads(content.decode('utf-8'))
+        raise error or BackendError('No backends configured')
@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 
+import asyncio
 import configparser
-import random
 import json
-import requests
 import os
+import tempfile
+from concurrent.futures import TimeoutError
+from functools import partial
 
-from flask import Flask, render_template, send_from_directory, redirect, url_for, request, current_app as app
+from quart import Quart, render_template, send_from_directory, send_file, redirect, url_for, request, \
+    current_app as app
 
 import frontend_assets
+from backend_client import BackendPool
+from plot_renderer import PlotRenderer
 
 config = configparser.ConfigParser()
 config.read('158.ini')
@@ -22,17 +27,32 @@ if 'tokenizer' not in config['services']:
 if 'disambiguator' not in config['services']:
     config['services']['disambiguator'] = 'http://localhost:5002'
 
-tokenizers = [url for url in config['services']['tokenizer'].split('\n') if url]
-print(tokenizers)
+backend_options = dict(timeout=config.getfloat('frontend', 'backend_timeout', fallback=30.),
+                       retries=config.getint('frontend', 'backend_retries', fallback=2),
+                       failures_threshold=config.getint('frontend', 'backend_failures', fallback=3),
+                       recovery_seconds=config.getfloat('frontend', 'backend_recovery', fallback=30.),
+                       connections=config.getint('frontend', 'backend_connections', fallback=10),
+                       use_msgpack=config.getboolean('frontend', 'backend_msgpack', fallback=True))
 
-disambiguators = [url for url in config['services']['disambiguator'].split('\n') if url]
-print(disambiguators)
+tokenizer_urls = [url for url in config['services']['tokenizer'].split('\n') if url]
+print(tokenizer_urls)
+tokenizers = BackendPool(tokenizer_urls, **backend_options)
 
-plot_langs = config['frontend']['plot_langs'].split(",")
-
-json_headers = {'Content-type': 'application/json'}
+disambiguator_urls = [url for url in config['services']['disambiguator'].split('\n') if url]
+print(disambiguator_urls)
+disambiguators = BackendPool(disambiguator_urls, **backend_options)
 
-app = Flask(__name__)
+plot_langs = config['frontend']['plot_langs'].split(",")
+plot_renderer = PlotRenderer(graphs_path="./plots",
+                             cache_path=config['frontend'].get('plot_cache',
+                                                               os.path.join(tempfile.gettempdir(), '158_plots')),
+                             top=config.getint('disambiguator', 'inventory_top', fallback=200),
+                             workers=config['frontend'].getint('plot_workers', 2))
+plot_timeout = config['frontend'].getfloat('plot_timeout', 30.)
+paragraph_workers = config['frontend'].getint('paragraph_workers', 8)
+request_timeout = config['frontend'].getfloat('request_timeout', 120.)
+
+app = Quart(__name__)
 app.url_map.strict_slashes = False
 
 frontend_assets.init(app)
@@ -42,57 +62,92 @@ with open("langs.json") as json_file:
     languages_values = list(languages_dict.items())
 
 
+@app.after_serving
+async def close_backends():
+    await tokenizers.close()
+    await disambiguators.close()
+
+
 @app.route('/', methods=['GET'])
-def index():
-    return render_template('index.html', langs_dict=languages_values)
+async def index():
+    return await render_template('index.html', langs_dict=languages_values)
 
 
 @app.route('/uwsd158')
-def wsd_redirect():
+async def wsd_redirect():
     return redirect(url_for('.index'), code=302)
 
 
-def disambiguate_text(input_text: str, tokenizer_url: str, disambiguator_url: str, chosen_language: str = None):
-    # tokenization
+async def disambiguate_text(input_text: str, chosen_language: str = None):
+    # tokenization, the language identification is skipped when the language is known
     text_data = {"text": input_text}
-    tokenization_req = requests.post(tokenizer_url, data=json.dumps(text_data), headers=json_headers)
-    tokenized_data = tokenization_req.json()
-
     if chosen_language:
-        tokenized_data["language"] = chosen_language
+        text_data["language"] = chosen_language
+    tokenized_data = await tokenizers.post("", text_data)
 
-    # disambiguation
-    disambiguation_req = requests.post(disambiguator_url, data=json.dumps(tokenized_data), headers=json_headers)
-    disambiguation = disambiguation_req.json()
+    # disambiguation, only the best sense of every token is shown
+    disambiguation = await disambiguators.post("disambiguate", dict(tokenized_data, top=1))
 
     return tokenized_data, disambiguation
 
 
+async def disambiguate_paragraphs(paragraphs: list, chosen_language: str = None):
+    """
+    Disambiguates the paragraphs concurrently. The paragraphs are tokenized in batches, a batch per tokenizer host,
+    and then every paragraph is sent to the least busy disambiguator host, at most paragraph_workers at once.
+    :return: list of (tokenization, disambiguation) in the order of the paragraphs
+    """
+    if not paragraphs:
+        return []
+    semaphore = asyncio.Semaphore(paragraph_workers)
+
+    batches_number = max(1, min(len(tokenizers.backends), len(paragraphs)))
+    batch_size = -(-len(paragraphs) // batches_number)
+    batches = [paragraphs[start:start + batch_size] for start in range(0, len(paragraphs), batch_size)]
+
+    async def tokenize_batch(texts):
+        text_data = {"texts": texts}
+        if chosen_language:
+            text_data["language"] = chosen_language
+        return (await tokenizers.post("batch", text_data))["results"]
+
+    async def disambiguate(tokenization):
+        async with semaphore:
+            return await disambiguators.post("disambiguate", dict(tokenization, top=1))
+
+    # if one of the requests fails, gather() cancels the others
+    tokenized_data = [tokenization for results in await asyncio.gather(*map(tokenize_batch, batches))
+                      for tokenization in results]
+    disambiguation = await asyncio.gather(*map(disambiguate, tokenized_data))
+    return list(zip(tokenized_data, disambiguation))
+
+
 @app.route('/wsd', methods=['POST'])
-def wsd():
-    text_input = request.form['text']
-    if 'known_language' in request.form:
-        chosen_lang = request.form['selected_language_main']
+async def wsd():
+    form = await request.form
+    text_input = form['text']
+    if 'known_language' in form:
+        chosen_lang = form['selected_language_main']
     else:
         chosen_lang = None
-    if 'dis_paragraph' in request.form:
+    if 'dis_paragraph' in form:
         disambiguate_by_paragraph = True
     else:
         disambiguate_by_paragraph = False
 
-    tokenizer_url = random.choice(tokenizers)
-    disambiguator_url = os.path.join(random.choice(disambiguators), "disambiguate")
-
     disambiguation = []
 
     if disambiguate_by_paragraph:
         found_languages = []
-        paragraphs = text_input.splitlines()
+        paragraphs = [paragraph for paragraph in text_input.splitlines() if paragraph.strip() != ""]
 
-        for paragraph in paragraphs:
-            if paragraph.strip() == "":
-                continue
-            tokenization_par, disambiguation_par = disambiguate_text(paragraph, tokenizer_url, disambiguator_url)
+        try:
+            paragraphs_results = await asyncio.wait_for(disambiguate_paragraphs(paragraphs, chosen_lang),
+                                                        request_timeout)
+        except asyncio.TimeoutError:
+            return "The text could not be processed in time, please try a shorter one", 504
+
+        for tokenization_par, disambiguation_par in paragraphs_results:
             found_languages.append(tokenization_par["language"])
             disambiguation.extend(disambiguation_par)
 
@@ -114,7 +169,11 @@ def wsd():
                 output_language = None
 
     else:
-        tokenization, disambiguation = disambiguate_text(text_input, tokenizer_url, disambiguator_url, chosen_lang)
+        try:
+            tokenization, disambiguation = await asyncio.wait_for(disambiguate_text(text_input, chosen_lang),
+                                                                  request_timeout)
+        except asyncio.TimeoutError:
+            return "The text could not be processed in time, please try a shorter one", 504
         output_language = tokenization["language"]
 
     result = []
@@ -128,26 +187,25 @@ def wsd():
 
         max_sense = max(result_senses, key=lambda sense: sense['confidence'])
         result.append(max_sense)
-    return render_template('wsd.html', output_language=output_language, disambiguation=result)
+    return await render_template('wsd.html', output_language=output_language, disambiguation=result)
 
 
 @app.route('/word_inventory', methods=['GET'])
-def word_senses():
-    return render_template('word_inventory.html', langs_dict=languages_values)
+async def word_senses():
+    return await render_template('word_inventory.html', langs_dict=languages_values)
 
 
 @app.route('/senses', methods=['POST'])
-def senses():
-    disambiguator_url = os.path.join(random.choice(disambiguators), "senses")
-    language = request.form["selected_language"]
-    word = request.form["word"].strip()
+async def senses():
+    form = await request.form
+    language = form["selected_language"]
+    word = form["word"].strip()
     error_msg = None
 
     data = {"language": language,
             "word": word}
     try:
-        answer = requests.post(disambiguator_url, data=json.dumps(data), headers=json_headers)
-        senses_list = answer.json()
+        senses_list = await asyncio.wait_for(disambiguators.post("senses", data), request_timeout)
     except Exception as e:
         print(e)
         senses_list = None
@@ -162,21 +220,35 @@ def senses():
     else:
         has_plot = False
 
-    return render_template('senses.html',
+    return await render_template('senses.html',
                            word=word, senses=senses_list, language=language,
                            has_plot=has_plot, error_msg=error_msg)
 
 
 @app.route('/plots/<lang>/<word>')
-def send_pdf(lang, word):
-    fpath = "./plots/{lang}/".format(lang=lang)
-    filename = '{word}.pdf'.format(word=word)
-    return send_from_directory(fpath, filename)
+async def send_plot(lang, word):
+    try:
+        # waiting for the renderer blocks, so it is done in a thread
+        svg_fpath = await asyncio.get_running_loop().run_in_executor(
+            None, partial(plot_renderer.get, lang, word, timeout=plot_timeout))
+    except TimeoutError:
+        return "The plot is being rendered, please try again later", 503
+    except Exception as e:
+        print(e)
+        return "Could not render the plot", 500
+
+    if svg_fpath is None:
+        # plots rendered by older versions of graph_induction
+        fpath = "./plots/{lang}/".format(lang=lang)
+        filename = '{word}.pdf'.format(word=word)
+        return await send_from_directory(fpath, filename)
+
+    return await send_file(svg_fpath, mimetype='image/svg+xml')
 
 
 @app.route('/favicon.ico')
-def favicon():
-    return send_from_directory(app.root_path, 'favicon.ico', mimetype='image/vnd.microsoft.icon')
+async def favicon():
+    return await send_from_directory(app.root_path, 'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
 
 if __name__ == '__main__':
@@ -7,21 +7,23 @@ from flask_assets import Bundle, Environment
 
 
 def init(app=None):
+    # the environment is bound to the app, so no application context is needed and a Quart app works too
     app = app or Flask(__name__)
 
-    with app.app_context():
-        env = Environment(app)
-        env.load_path = [path.join(path.dirname(__file__), 'assets')]
-        env.url = app.static_url_path
-        env.directory = app.static_folder
-        env.auto_build = app.debug
-        env.manifest = 'file'
+    env = Environment(app)
+    env.load_path = [path.join(path.dirname(__file__), 'assets')]
+    env.url = app.static_url_path
+    env.directory = app.static_folder
+    env.auto_build = app.debug
+    env.manifest = 'file'
 
-        scss = Bundle('stylesheet.scss', filters='pyscss', output='stylesheet.css')
-        env.register('scss_all', scss)
+    scss = Bundle('stylesheet.scss', filters='pyscss', output='stylesheet.css')
+    env.register('scss_all', scss)
+    # the {% assets %} tag cannot be used in the asynchronous templates of Quart
+    app.add_template_global(lambda name: env[name].urls(), 'asset_urls')
 
-        bundles = [scss]
-        return bundles
+    bundles = [scss]
+    return bundles
 
 
 if __name__ == '__main__':
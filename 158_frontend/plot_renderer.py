@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import math
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+SVG_SIZE = 800
+LAYOUT_ITERATIONS = 50
+
+
+def spring_layout(nodes_number, edges, iterations=LAYOUT_ITERATIONS, seed=0):
+    """Fruchterman-Reingold layout in the unit square, the same idea as networkx.spring_layout."""
+    rng = random.Random(seed)
+    pos = [[rng.random(), rng.random()] for _ in range(nodes_number)]
+    if nodes_number < 2:
+        return pos
+
+    k = 0.75 / math.sqrt(nodes_number)
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        disp = [[0., 0.] for _ in range(nodes_number)]
+        for i in range(nodes_number):
+            xi, yi = pos[i]
+            for j in range(i + 1, nodes_number):
+                dx, dy = xi - pos[j][0], yi - pos[j][1]
+                dist2 = max(dx * dx + dy * dy, 1e-6)
+                force = k * k / dist2
+                disp[i][0] += dx * force
+                disp[i][1] += dy * force
+                disp[j][0] -= dx * force
+                disp[j][1] -= dy * force
+        for i, j, weight in edges:
+            dx, dy = pos[i][0] - pos[j][0], pos[i][1] - pos[j][1]
+            dist = max(math.sqrt(dx * dx + dy * dy), 1e-3)
+            force = weight * dist / k
+            disp[i][0] -= dx * force
+            disp[i][1] -= dy * force
+            disp[j][0] += dx * force
+            disp[j][1] += dy * force
+        for i in range(nodes_number):
+            length = max(math.hypot(disp[i][0], disp[i][1]), 1e-6)
+            step = min(length, temperature)
+            pos[i][0] += disp[i][0] / length * step
+            pos[i][1] += disp[i][1] / length * step
+        temperature -= cooling
+
+    xs = [x for x, _ in pos]
+    ys = [y for _, y in pos]
+    scale = max(max(xs) - min(xs), max(ys) - min(ys), 1e-6)
+    return [[(x - min(xs)) / scale, (y - min(ys)) / scale] for x, y in pos]
+
+
+def label_color(label_id, labels_number):
+    hue = int(360. * label_id / max(labels_number, 1))
+    return "hsl({},80%,55%)".format(hue)
+
+
+def render_svg(graph):
+    """Renders a clustered ego network (as saved by graph_induction -viz) to an SVG string."""
+    nodes = graph["nodes"]
+    edges = graph["edges"]
+    pos = spring_layout(len(nodes), edges)
+
+    label2id = {}
+    for label in graph["labels"]:
+        label2id.setdefault(label, len(label2id))
+
+    margin = 40
+    scale = SVG_SIZE - 2 * margin
+    xy = [(margin + x * scale, margin + y * scale) for x, y in pos]
+
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{0}" viewBox="0 0 {0} {0}" '
+             'font-family="sans-serif" font-size="11">'.format(SVG_SIZE),
+             '<title>{}</title>'.format(escape(graph["word"])),
+             '<g stroke="gray" stroke-opacity="0.4">']
+    for i, j, _ in edges:
+        parts.append('<line x1="{:.1f}" y1="{:.1f}" x2="{:.1f}" y2="{:.1f}"/>'.format(*xy[i], *xy[j]))
+    parts.append('</g><g fill-opacity="0.75">')
+    for (x, y), size, label in zip(xy, graph["sizes"], graph["labels"]):
+        parts.append('<circle cx="{:.1f}" cy="{:.1f}" r="{:.1f}" fill="{}"/>'.format(
+            x, y, 4 + 3 * math.sqrt(size), label_color(label2id[label], len(label2id))))
+    parts.append('</g><g font-weight="bold" text-anchor="middle">')
+    for (x, y), node in zip(xy, nodes):
+        parts.append('<text x="{:.1f}" y="{:.1f}">{}</text>'.format(x, y - 6, escape(node)))
+    parts.append('</g></svg>')
+    return "\n".join(parts)
+
+
+def render_to_file(graph_fpath, svg_fpath):
+    """Renders the graph file into the SVG file, runs in a worker process."""
+    with open(graph_fpath, encoding="utf-8") as f:
+        svg = render_svg(json.load(f))
+
+    os.makedirs(os.path.dirname(svg_fpath), exist_ok=True)
+    tmp_fpath = "{}.{}.tmp".format(svg_fpath, os.getpid())
+    with open(tmp_fpath, "w", encoding="utf-8") as out:
+        out.write(svg)
+    os.replace(tmp_fpath, svg_fpath)
+    return svg_fpath
+
+
+class PlotRenderer(object):
+    """
+    Renders ego network plots on first request in a bounded pool of worker processes
+    and keeps the SVG files in an on-disk cache. A cached plot is rendered again when its
+    graph file is newer. Concurrent requests for the same plot wait for a single rendering job.
+    """
+
+    def __init__(self, graphs_path, cache_path, top, workers=2):
+        self.graphs_path = graphs_path
+        self.cache_path = cache_path
+        self.top = top
+        self.workers = workers
+        self._executor = None
+        self._executor_pid = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def graph_fpath(self, lang, word):
+        return os.path.join(self.graphs_path, lang, str(self.top), "{}.json".format(word))
+
+    def svg_fpath(self, lang, word):
+        return os.path.join(self.cache_path, lang, str(self.top), "{}.svg".format(word))
+
+    def _get_executor(self):
+        # the pool is created lazily, so that every forked server worker gets its own
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._executor_pid = os.getpid()
+            self._jobs = {}
+        return self._executor
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._jobs.get(key) is future:
+                del self._jobs[key]
+
+    def get(self, lang, word, timeout=None):
+        """
+        Returns the path of the rendered SVG or None if there is no graph for the word.
+        Raises concurrent.futures.TimeoutError if rendering takes longer than timeout seconds
+        and passes on the errors of the rendering, e.g. for a broken graph file.
+        """
+        if any(part in ("", ".", "..") or os.sep in part for part in (lang, word)):
+            return None
+
+        graph_fpath = self.graph_fpath(lang, word)
+        svg_fpath = self.svg_fpath(lang, word)
+        try:
+            graph_mtime = os.path.getmtime(graph_fpath)
+        except OSError:
+            return None
+        if os.path.exists(svg_fpath) and os.path.getmtime(svg_fpath) >= graph_mtime:
+            return svg_fpath
+
+        key = (lang, word)
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is None:
+                future = self._get_executor().submit(render_to_file, graph_fpath, svg_fpath)
+                self._jobs[key] = future
+        # outside of the lock: the callback runs immediately if the job is already finished
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future.result(timeout=timeout)
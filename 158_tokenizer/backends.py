@@ -0,0 +1,767 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Long-lived tokenizer backends shared by tokenizer_json.py and tokenizer_server.py.
+Every backend loads its model once per server process and is safe to use from many threads;
+the external tokenizers run as long-lived processes that are fed line by line.
+"""
+
+import os
+import re
+import sys
+import html
+import time
+import queue
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import MeCab
+
+from tokenization_cache import TokenizationCache
+
+try:
+    import icu
+except ImportError:
+    import PyICU as icu  # older name of the PyICU module
+
+try:
+    import fasttext  # the Python bindings load the model in-process if they are installed
+except ImportError:
+    fasttext = None
+
+LID_BINARY = 'language_identification/fasttext'
+LID_MODEL = 'language_identification/lid.176.ftz'
+MOSES_SCRIPT = os.path.abspath('Europarl/tokenizer.perl')
+NONBREAKING_PREFIXES = os.path.abspath('Europarl/nonbreaking_prefixes/nonbreaking_prefix.{}')
+# tokenizer.perl buffers its output when it writes to a pipe; $0 lets it find the nonbreaking prefixes
+MOSES_COMMAND = ['perl', '-e', '$| = 1; $0 = shift; do $0; die $@ if $@;', MOSES_SCRIPT, '-q', '-l']
+
+CHINESE_COMMAND = ['java', '-mx1g', '-cp', 'stanford_segmenter/*:segmenters', 'SegServer',
+                   'stanford_segmenter/data', 'pku']
+VIETNAMESE_COMMAND = ['java', '-cp', 'UETSegmenter/uetsegmenter.jar:segmenters', 'UETSegServer', 'UETSegmenter/models/']
+
+CHUNK_LINES = 1000  # lines written before their answers are read, bounds the time a hang goes unnoticed
+TIMEOUT = 30.
+HEALTH_CHECK_SECONDS = 60.
+IDLE_SECONDS = 600.  # Moses workers unused for this long are stopped
+MAX_MOSES_PROCESSES = 32  # tokenizer.perl processes for all the languages
+STARTUP_TIMEOUT = 300.  # loading a JVM segmenter model takes a while
+BATCH_LINES = 256
+LID_PREFIX = 1000  # characters classified by the language-only endpoint
+TOKENIZER_VERSION = 1  # part of the tokenization cache keys, increase it when the output of the tokenizers changes
+DOCUMENT_SENTENCES = 8  # minimum number of sentences per chunk of a document tokenized in parallel
+
+# the labels of the language identification model (lid.176) and the other languages of the demo (langs.json);
+# a language hint has to be one of them, every language tokenized with Moses keeps its own processes
+LANGUAGES = frozenset((
+    'af als am an ar arz as ast av az azb ba bar bcl be bg bh bn bo bpy br bs bxr ca cbk ce ceb ckb co cs cv cy '
+    'da de diq dsb dty dv el eml en eo es et eu fa fi fr frr fy ga gd gl gn gom gu gv he hi hif hr hsb ht hu hy '
+    'ia id ie ilo io is it ja jbo jv ka kk km kn ko krc ku kv kw ky la lb lez li lmo lo lrc lt lv mai mg mhr min '
+    'mk ml mn mr mrj ms mt mwl my myv mzn nah nap nds ne new nl nn no oc or os pa pam pfl pl pms pnb ps pt qu rm '
+    'ro ru rue sa sah sc scn sco sd sh si sk sl so sq sr su sv sw ta te tg th tk tl tr tt tyv ug uk ur uz vec vep '
+    'vi vls vo wa war wuu xal xmf yi yo yue zh '
+    'nso zea').split())
+CJK_LANGS = {'zh', 'ja'}
+# sentence final punctuation with closing quotes and brackets, followed by a space in most languages
+SENTENCE_END = re.compile(r'[.!?\u2026\u0964\u0965\u061f\u06d4\u1362]+[\'"\u00bb\u201d\u2019)\]]*(?=\s)')
+CJK_SENTENCE_END = re.compile(r'[\u3002\uff01\uff1f!?]+[\u300d\u300f\u201d\uff09)]*')
+LAST_WORD = re.compile(r'(\S+)\.$')
+NEXT_CHAR = re.compile(r'\s*(\S)')
+
+
+def check_language(language):
+    """Raises ValueError if the language hint is not a known language code."""
+    if language and language not in LANGUAGES:
+        raise ValueError('Unknown language {!r}'.format(language))
+
+
+def _one_line(text):
+    """Backends read line by line, so a text has to be a single line."""
+    return ' '.join(text.splitlines())
+
+
+class LineProcess(object):
+    """
+    A long-lived process that answers every input line with exactly one output line.
+    The output is read by a thread, so a hanging process is detected with a timeout.
+    With ready=True the process prints a line when it has loaded its model, which is
+    waited for startup_timeout seconds.
+    """
+
+    def __init__(self, command, timeout=TIMEOUT, ready=False, startup_timeout=STARTUP_TIMEOUT):
+        self.command = command
+        self.timeout = timeout
+        self.last_used = time.time()
+        self._lines = queue.Queue()
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL)
+        threading.Thread(target=self._read, daemon=True).start()
+
+        if ready:
+            try:
+                banner = self._lines.get(timeout=startup_timeout)
+            except queue.Empty:
+                banner = None
+            if banner is None:
+                self.close()
+                raise RuntimeError('{} did not start'.format(' '.join(command)))
+
+    def _read(self):
+        for line in iter(self._process.stdout.readline, b''):
+            self._lines.put(line)
+        self._lines.put(None)
+
+    def alive(self):
+        return self._process.poll() is None
+
+    def process(self, lines):
+        """
+        Sends the lines to the process and returns its answers.
+        Raises TimeoutError if an answer takes longer than timeout seconds
+        and RuntimeError if the process exits; the process cannot be used afterwards then.
+        """
+        answers = []
+        try:
+            for start in range(0, len(lines), CHUNK_LINES):
+                chunk = lines[start:start + CHUNK_LINES]
+                self._process.stdin.write(''.join(_one_line(line) + '\n' for line in chunk).encode('utf-8'))
+                self._process.stdin.flush()
+                for _ in chunk:
+                    answer = self._lines.get(timeout=self.timeout)
+                    if answer is None:
+                        raise RuntimeError('{} exited with {}'.format(self.command[0], self._process.poll()))
+                    answers.append(answer.decode('utf-8').rstrip('\n'))
+        except queue.Empty:
+            self.close()
+            raise TimeoutError('{} did not answer in {} sec.'.format(self.command[0], self.timeout))
+        except (BrokenPipeError, RuntimeError):
+            self.close()
+            raise
+        self.last_used = time.time()
+        return answers
+
+    def check(self):
+        """Health check: the process is running and answers an empty line."""
+        if not self.alive():
+            return False
+        try:
+            return len(self.process([''])) == 1
+        except (TimeoutError, RuntimeError, BrokenPipeError):
+            return False
+
+    def close(self):
+        if self.alive():
+            self._process.kill()
+        self._process.wait()
+
+
+class ProcessPool(object):
+    """
+    Bounded pool of long-lived LineProcess workers per key, e.g. per language.
+    Workers are started on demand up to size per key and up to max_workers for all the keys,
+    checked when they were idle for health_check_seconds and replaced when they exit or hang.
+    When max_workers are running, the least recently used idle worker of another key is stopped
+    to start a new one; workers idle for idle_seconds are stopped by a reaper thread.
+    """
+
+    def __init__(self, factory, size, health_check_seconds=HEALTH_CHECK_SECONDS, max_workers=None,
+                 idle_seconds=None):
+        self.factory = factory
+        self.size = size
+        self.health_check_seconds = health_check_seconds
+        self.max_workers = max_workers or None
+        self.idle_seconds = idle_seconds or None
+        self._idle = {}
+        self._count = {}
+        self._total = 0
+        self._condition = threading.Condition()
+        self._closed = threading.Event()
+        if self.idle_seconds is not None:
+            threading.Thread(target=self._reap, daemon=True).start()
+
+    def _pop_least_recently_used(self):
+        """Removes the idle worker that was used least recently from the pool, None if there is none."""
+        keys = [key for key, workers in self._idle.items() if workers]
+        if not keys:
+            return None, None
+        key = min(keys, key=lambda key: self._idle[key][0].last_used)
+        self._count[key] -= 1
+        self._total -= 1
+        return key, self._idle[key].pop(0)
+
+    def _acquire(self, key):
+        with self._condition:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                if idle:
+                    worker = idle.pop()
+                    break
+                if self._count.get(key, 0) < self.size:
+                    if self.max_workers is not None and self._total >= self.max_workers:
+                        evicted_key, evicted = self._pop_least_recently_used()
+                        if evicted is None:
+                            self._condition.wait()
+                            continue
+                        # stopped before the lock is released, so that max_workers are never exceeded
+                        print('Stopping an idle worker for', evicted_key, 'to start one for', key, file=sys.stderr)
+                        evicted.close()
+                    self._count[key] = self._count.get(key, 0) + 1
+                    self._total += 1
+                    worker = None
+                    break
+                self._condition.wait()
+
+        if worker is not None:
+            recently_used = time.time() - worker.last_used < self.health_check_seconds
+            if worker.alive() and (recently_used or worker.check()):
+                return worker
+            worker.close()
+            print('Restarting an unhealthy worker for', key, file=sys.stderr)
+        try:
+            return self.factory(key)
+        except Exception:
+            self._release(key, None)
+            raise
+
+    def _release(self, key, worker):
+        with self._condition:
+            if worker is not None and worker.alive():
+                self._idle[key].append(worker)
+            else:
+                self._count[key] -= 1
+                self._total -= 1
+            # the waiting threads may wait for different keys
+            self._condition.notify_all()
+
+    def reap_idle(self):
+        """Stops the workers that were idle for idle_seconds and returns their number."""
+        deadline = time.time() - self.idle_seconds
+        reaped = []
+        with self._condition:
+            for key, workers in self._idle.items():
+                # idle workers are appended when released, so the oldest ones come first
+                while workers and workers[0].last_used < deadline:
+                    reaped.append(workers.pop(0))
+                    self._count[key] -= 1
+                    self._total -= 1
+            if reaped:
+                self._condition.notify_all()
+        for worker in reaped:
+            worker.close()
+        return len(reaped)
+
+    def _reap(self):
+        while not self._closed.wait(min(self.idle_seconds / 2, self.health_check_seconds)):
+            reaped = self.reap_idle()
+            if reaped:
+                print('Stopped', reaped, 'idle workers', file=sys.stderr)
+
+    @property
+    def workers_number(self):
+        with self._condition:
+            return self._total
+
+    def process(self, key, lines):
+        """Processes the lines on a worker for key, waits if all of them are busy."""
+        worker = self._acquire(key)
+        try:
+            return worker.process(lines)
+        finally:
+            self._release(key, worker)
+
+    def close(self):
+        self._closed.set()
+        with self._condition:
+            for key, workers in self._idle.items():
+                for worker in workers:
+                    worker.close()
+                self._count[key] -= len(workers)
+                self._total -= len(workers)
+            self._idle = {}
+
+
+class MosesTokenizer(object):
+    """
+    Europarl (Moses) tokenizer.perl processes kept running, a pool per language. At most max_processes
+    run for all the languages and the ones idle for idle_seconds are stopped.
+    """
+
+    def __init__(self, pool_size=2, timeout=TIMEOUT, max_processes=MAX_MOSES_PROCESSES, idle_seconds=IDLE_SECONDS):
+        self.pool = ProcessPool(lambda language: LineProcess(MOSES_COMMAND + [language], timeout), pool_size,
+                                max_workers=max_processes, idle_seconds=idle_seconds)
+
+    def tokenize_batch(self, texts, language):
+        """Returns the tokenized texts, tokens are separated by spaces."""
+        return self.pool.process(language, texts)
+
+    def tokenize(self, text, language):
+        return self.tokenize_batch([text], language)[0]
+
+
+class BatchQueue(object):
+    """
+    Sends the texts of concurrent requests to a ProcessPool in batches: while the workers are busy
+    the requests queue up and the next free worker takes all of them, up to batch_lines lines, at once.
+    """
+
+    def __init__(self, pool, key, batch_lines=BATCH_LINES):
+        self.pool = pool
+        self.key = key
+        self.batch_lines = batch_lines
+        self._requests = queue.Queue()
+        for _ in range(pool.size):
+            threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def _dispatch(self):
+        while True:
+            batch = [self._requests.get()]
+            lines_number = len(batch[0][0])
+            while lines_number < self.batch_lines:
+                try:
+                    batch.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+                lines_number += len(batch[-1][0])
+
+            try:
+                answers = self.pool.process(self.key, [line for lines, _ in batch for line in lines])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for lines, future in batch:
+                future.set_result(answers[start:start + len(lines)])
+                start += len(lines)
+
+    def process(self, lines):
+        future = Future()
+        self._requests.put((lines, future))
+        return future.result()
+
+
+class JavaSegmenter(object):
+    """A segmenter running in long-lived JVM processes (see segmenters/), requests are batched."""
+
+    def __init__(self, command, pool_size=1, timeout=TIMEOUT):
+        pool = ProcessPool(lambda key: LineProcess(command, timeout, ready=True), pool_size)
+        self._queue = BatchQueue(pool, 'segmenter')
+
+    def tokenize_batch(self, texts):
+        """Returns the segmented texts, tokens are separated by spaces."""
+        return self._queue.process(texts)
+
+    def tokenize(self, text, language=None):
+        return self.tokenize_batch([text])[0]
+
+
+class ICUTokenizer(object):
+    """
+    Word segmentation with ICU break iterators. Creating an iterator loads the break rules of the locale,
+    so a prototype per locale is kept and cloned; a BreakIterator is not thread-safe, so every clone is
+    used by one thread at a time and returned to a free list of its locale afterwards.
+    """
+
+    def __init__(self):
+        self._prototypes = {}
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, language):
+        with self._lock:
+            free = self._free.setdefault(language, [])
+            if free:
+                return free.pop()
+            if language not in self._prototypes:
+                self._prototypes[language] = icu.BreakIterator.createWordInstance(icu.Locale(language))
+            return self._prototypes[language].clone()
+
+    def _release(self, language, iterator):
+        with self._lock:
+            self._free[language].append(iterator)
+
+    @staticmethod
+    def _utf16_positions(text):
+        """Maps UTF-16 offsets, which ICU returns, to string indices; None if they are the same."""
+        if not text or max(text) <= '\uffff':
+            return None
+        positions = []
+        for index, char in enumerate(text):
+            positions.append(index)
+            if char > '\uffff':
+                positions.append(index)  # a surrogate pair takes two UTF-16 units
+        positions.append(len(text))
+        return positions
+
+    def tokenize(self, text, language):
+        """Returns the list of tokens, whitespace between the words is dropped."""
+        iterator = self._acquire(language)
+        try:
+            iterator.setText(text)
+            boundaries = list(iterator)
+        finally:
+            self._release(language, iterator)
+
+        positions = self._utf16_positions(text)
+        if positions is not None:
+            boundaries = [positions[boundary] for boundary in boundaries]
+
+        tokens = []
+        start = 0
+        for end in boundaries:
+            tokens.extend(text[start:end].split())  # drops the whitespace segments
+            start = end
+        return tokens
+
+
+class MeCabTokenizer(object):
+    """
+    Japanese tokenization with a bounded pool of MeCab taggers. A Tagger must not be used by
+    two threads at once, so every call takes a tagger of its own; at most pool_size are created.
+    """
+
+    def __init__(self, pool_size=4):
+        self.pool_size = pool_size
+        self._free = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.pool_size
+            if create:
+                self._created += 1
+        if create:
+            return MeCab.Tagger("-Owakati")
+        return self._free.get()
+
+    def tokenize_batch(self, texts):
+        """Returns the tokenized texts, tokens are separated by spaces."""
+        tagger = self._acquire()
+        try:
+            return [tagger.parse(_one_line(text)).strip() for text in texts]
+        finally:
+            self._free.put(tagger)
+
+    def tokenize(self, text, language=None):
+        return self.tokenize_batch([text])[0]
+
+
+class LanguageIdentifier(object):
+    """
+    fastText language identification with the model loaded once. Uses the fasttext Python module
+    when it is installed, otherwise a `fasttext predict` process that is fed line by line.
+    """
+
+    def __init__(self, model_fpath=LID_MODEL, binary=LID_BINARY, timeout=TIMEOUT):
+        self._model = None
+        self._pool = None
+        if fasttext is not None:
+            self._model = fasttext.load_model(model_fpath)
+        else:
+            command = [binary, 'predict', model_fpath, '-']
+            self._pool = ProcessPool(lambda key: LineProcess(command, timeout), size=1)
+
+    def identify_batch(self, texts):
+        """Returns the language codes of the texts, e.g. ['en', 'de']."""
+        lines = [_one_line(text) for text in texts]
+        if not lines:
+            return []
+        if self._model is not None:
+            labels = [label[0] for label in self._model.predict(lines)[0]]
+        else:
+            labels = self._pool.process('lid', lines)
+        return [label.strip().split('__')[-1] for label in labels]
+
+    def identify(self, text):
+        return self.identify_batch([text])[0]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def _get_instance(name, factory):
+    # created lazily, so that every forked server worker loads its own models
+    key = (name, os.getpid())
+    with _instances_lock:
+        if key not in _instances:
+            print('Loading', name, file=sys.stderr)
+            _instances[key] = factory()
+        return _instances[key]
+
+
+def get_language_identifier():
+    return _get_instance('language identifier', LanguageIdentifier)
+
+
+def get_moses_tokenizer(pool_size=2, timeout=TIMEOUT, max_processes=MAX_MOSES_PROCESSES, idle_seconds=IDLE_SECONDS):
+    return _get_instance('Moses tokenizer', lambda: MosesTokenizer(pool_size, timeout, max_processes, idle_seconds))
+
+
+def get_mecab_tokenizer(pool_size=4):
+    return _get_instance('MeCab tokenizer', lambda: MeCabTokenizer(pool_size))
+
+
+def get_icu_tokenizer():
+    return _get_instance('ICU tokenizer', ICUTokenizer)
+
+
+def get_chinese_segmenter(pool_size=1, timeout=TIMEOUT):
+    return _get_instance('Stanford segmenter', lambda: JavaSegmenter(CHINESE_COMMAND, pool_size, timeout))
+
+
+def get_vietnamese_segmenter(pool_size=1, timeout=TIMEOUT):
+    return _get_instance('UETsegmenter', lambda: JavaSegmenter(VIETNAMESE_COMMAND, pool_size, timeout))
+
+
+def _nonbreaking_prefixes(language):
+    """Words that do not end a sentence when followed by a period, from the tokenizer.perl prefix files."""
+    fpath = NONBREAKING_PREFIXES.format(language)
+    if not language.isalpha() or not os.path.exists(fpath):
+        fpath = NONBREAKING_PREFIXES.format('en')
+    prefixes, numeric_only = set(), set()
+    with open(fpath, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if '#NUMERIC_ONLY#' in line:
+                numeric_only.add(line.split()[0])
+            else:
+                prefixes.add(line)
+    return prefixes, numeric_only
+
+
+def split_sentences(text, language):
+    """
+    Splits a text into sentences at line breaks and at sentence final punctuation; a period after
+    a known abbreviation of the language (e.g. 'Dr.') does not end a sentence.
+    :return: list of (start, end) character offsets of the non-empty sentences
+    """
+    if language in CJK_LANGS:
+        pattern, prefixes, numeric_only = CJK_SENTENCE_END, set(), set()
+    else:
+        pattern = SENTENCE_END
+        prefixes, numeric_only = _get_instance('nonbreaking prefixes ' + language,
+                                               lambda: _nonbreaking_prefixes(language))
+
+    spans = []
+    for line in re.finditer(r'[^\n]+', text):
+        start = line.start()
+        for match in pattern.finditer(line.group()):
+            end = line.start() + match.end()
+            if match.group() == '.':
+                period = line.start() + match.start()
+                last_word = LAST_WORD.search(text, max(start, period - 32), period + 1)
+                following = NEXT_CHAR.match(text, end, line.end())
+                following = following.group(1) if following is not None else ''
+                word = last_word.group(1) if last_word is not None else ''
+                if word in prefixes or (word in numeric_only and following.isdigit()) or following.islower():
+                    continue
+            spans.append((start, end))
+            start = end
+        spans.append((start, line.end()))
+    trimmed = []
+    for start, end in spans:
+        sentence = text[start:end]
+        if sentence.strip():
+            start += len(sentence) - len(sentence.lstrip())
+            trimmed.append((start, start + len(sentence.strip())))
+    return trimmed
+
+
+def align_tokens(text, tokens, start=0, end=None):
+    """
+    Finds the tokens in the text in their order, the escaping of tokenizer.perl is undone.
+    :return: list of [start, end] character offsets of the tokens, None for a token that is not found
+    """
+    end = len(text) if end is None else end
+    offsets = []
+    position = start
+    for token in tokens:
+        index = text.find(token, position, end)
+        if index < 0:
+            token = html.unescape(token)
+            index = text.find(token, position, end)
+        if index < 0:
+            offsets.append(None)
+            continue
+        offsets.append([index, index + len(token)])
+        position = index + len(token)
+    return offsets
+
+
+class Tokenizer(object):
+    """
+    Identifies the languages of texts and tokenizes them with the preferred tokenizer of each language:
+    Stanford for Chinese, UETsegmenter for Vietnamese, MeCab for Japanese, ICU for the icu_langs
+    and the Europarl (Moses) tokenizer for the rest. Texts are grouped by language and every group
+    goes to its backend in one call. The results are cached, repeated texts skip both the language
+    identification and the tokenization. Texts longer than document_chars are split into sentences
+    that are tokenized in parallel (see tokenize_document).
+    """
+
+    def __init__(self, icu_langs, moses_pool_size=2, segmenter_pool_size=1, mecab_pool_size=4, timeout=TIMEOUT,
+                 lid_prefix=LID_PREFIX, cache_size=100000, cache_path=None, cache_disk_size=1000000, document_chars=0,
+                 moses_max_processes=MAX_MOSES_PROCESSES, moses_idle_seconds=IDLE_SECONDS):
+        self.icu_langs = set(icu_langs)
+        self.cache = TokenizationCache('{}:{}'.format(TOKENIZER_VERSION, ','.join(sorted(self.icu_langs))),
+                                       size=cache_size, cache_path=cache_path, disk_size=cache_disk_size)
+        self.lid_prefix = lid_prefix
+        self.document_chars = document_chars
+        self.moses_pool_size = moses_pool_size
+        self.moses_max_processes = moses_max_processes
+        self.moses_idle_seconds = moses_idle_seconds
+        self.segmenter_pool_size = segmenter_pool_size
+        self.mecab_pool_size = mecab_pool_size
+        self.timeout = timeout
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+    def _tokenize_group(self, texts, language):
+        """Returns a list of tokens for every text of the language."""
+        if language == 'zh':
+            tokenized = get_chinese_segmenter(self.segmenter_pool_size, self.timeout).tokenize_batch(texts)
+        elif language == 'vi':
+            tokenized = get_vietnamese_segmenter(self.segmenter_pool_size, self.timeout).tokenize_batch(texts)
+        elif language == 'ja':
+            tokenized = get_mecab_tokenizer(self.mecab_pool_size).tokenize_batch(texts)
+        elif language in self.icu_langs:
+            icu_tokenizer = get_icu_tokenizer()
+            return [icu_tokenizer.tokenize(text, language) for text in texts]
+        else:
+            tokenized = get_moses_tokenizer(self.moses_pool_size, self.timeout, self.moses_max_processes,
+                                            self.moses_idle_seconds).tokenize_batch(texts, language)
+        return [line.split() for line in tokenized]
+
+    def identify_batch(self, texts):
+        """Identifies the languages of the texts by their first lid_prefix characters."""
+        return get_language_identifier().identify_batch([text[:self.lid_prefix] for text in texts])
+
+    def identify(self, text):
+        return self.identify_batch([text])[0]
+
+    def _tokenize_batch(self, texts, languages):
+        unknown = [index for index, text_language in enumerate(languages) if not text_language]
+        if unknown:
+            identified = get_language_identifier().identify_batch([texts[index] for index in unknown])
+            for index, text_language in zip(unknown, identified):
+                languages[index] = text_language
+
+        groups = {}
+        for index, language in enumerate(languages):
+            groups.setdefault(language, []).append(index)
+
+        results = [None] * len(texts)
+        for language, indices in groups.items():
+            if self.document_chars > 0:
+                for index in [i for i in indices if len(texts[i]) > self.document_chars]:
+                    results[index] = {'language': language,
+                                      'tokens': self.tokenize_document(texts[index], language)['tokens']}
+                indices = [i for i in indices if results[i] is None]
+            for index, tokens in zip(indices, self._tokenize_group([texts[i] for i in indices], language)):
+                results[index] = {'language': language, 'tokens': tokens}
+        return results
+
+    def tokenize_batch(self, texts, language=None):
+        """
+        Tokenizes many texts at once.
+        :param texts: list of texts
+        :param language: language of all the texts or a list with the language of each text; the language
+        identification is skipped for the texts with a known language; ValueError if it is not in LANGUAGES
+        :return: list of {'language': language, 'tokens': [token, ...]} in the order of the texts
+        """
+        if language is None or isinstance(language, str):
+            languages = [language] * len(texts)
+        else:
+            languages = list(language)
+        for text_language in set(languages):
+            check_language(text_language)
+
+        results = [None] * len(texts)
+        missing = {}  # key => indices of the texts, a text repeated in the batch is tokenized once
+        for index, (text, text_language) in enumerate(zip(texts, languages)):
+            key = self.cache.key(text, text_language)
+            if key not in missing:
+                results[index] = self.cache.get(key)
+            if results[index] is None:
+                missing.setdefault(key, []).append(index)
+
+        if missing:
+            keys = list(missing)
+            indices = [missing[key][0] for key in keys]
+            tokenized = self._tokenize_batch([texts[i] for i in indices], [languages[i] for i in indices])
+            for key, result in zip(keys, tokenized):
+                self.cache.put(key, result)
+                for index in missing[key]:
+                    results[index] = {'language': result['language'], 'tokens': list(result['tokens'])}
+        return results
+
+    def tokenize(self, text, language=None):
+        return self.tokenize_batch([text], language)[0]
+
+    def _parallelism(self, language):
+        """Number of backend workers that can tokenize the language at once."""
+        if language in ('zh', 'vi'):
+            return self.segmenter_pool_size
+        if language == 'ja':
+            return self.mecab_pool_size
+        if language in self.icu_langs:
+            return 1  # in-process, the chunks would wait for each other
+        return self.moses_pool_size
+
+    def _get_executor(self):
+        # created lazily, so that every forked server worker gets its own threads
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                workers = max(self.moses_pool_size, self.segmenter_pool_size, self.mecab_pool_size)
+                self._executor = ThreadPoolExecutor(max_workers=workers)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def tokenize_document(self, text, language=None):
+        """
+        Tokenizes a long text sentence by sentence. The sentences are tokenized in chunks,
+        one chunk per backend worker of the language, in parallel. The result is not cached.
+        :param text: text of any length, possibly with line breaks
+        :param language: language of the text, identified if not given
+        :return: {'language': language, 'tokens': [token, ...], 'offsets': [[start, end], ...],
+        'sentences': [[start, end], ...]}; offsets are the character offsets of the tokens in the text,
+        None for a token that was changed by the tokenizer beyond recognition
+        """
+        check_language(language)
+        if not language:
+            language = get_language_identifier().identify(text)
+
+        spans = split_sentences(text, language)
+        sentences = [text[start:end] for start, end in spans]
+        chunks_number = max(1, min(self._parallelism(language), len(sentences) // DOCUMENT_SENTENCES))
+        chunk_size = max(1, -(-len(sentences) // chunks_number))
+        chunks = [sentences[start:start + chunk_size] for start in range(0, len(sentences), chunk_size)]
+
+        if len(chunks) > 1:
+            executor = self._get_executor()
+            tokenized = [sentence_tokens
+                         for chunk_tokens in executor.map(lambda chunk: self._tokenize_group(chunk, language), chunks)
+                         for sentence_tokens in chunk_tokens]
+        else:
+            tokenized = self._tokenize_group(sentences, language)
+
+        tokens, offsets = [], []
+        for (start, end), sentence_tokens in zip(spans, tokenized):
+            tokens.extend(sentence_tokens)
+            offsets.extend(align_tokens(text, sentence_tokens, start, end))
+        return {'language': language, 'tokens': tokens, 'offsets': offsets,
+                'sentences': [list(span) for span in spans]}
@@ -0,0 +1,49 @@
+import java.io.*;
+import java.util.Properties;
+
+import edu.stanford.nlp.ie.crf.CRFClassifier;
+import edu.stanford.nlp.ling.CoreLabel;
+
+
+/** Stanford Chinese segmenter kept in memory for the tokenizer server.
+ *  Reads a text per line from stdin and writes its space-separated tokens as a line to stdout.
+ *  Prints a "ready" line once the model is loaded.
+ *  <p/>
+ *  <code>
+ *  Usage: java -mx1g -cp "stanford_segmenter/*:segmenters" SegServer stanford_segmenter/data pku
+ *  </code>
+ */
+
+public class SegServer {
+
+  public static void main(String[] args) throws Exception {
+    String datadir = args[0];
+    String model = args.length > 1 ? args[1] : "pku";
+
+    // the segmenter logs to stdout, which is reserved for the answers
+    PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), false, "UTF-8");
+    System.setOut(System.err);
+
+    Properties props = new Properties();
+    props.setProperty("sighanCorporaDict", datadir);
+    props.setProperty("serDictionary", datadir + "/dict-chris6.ser.gz");
+    props.setProperty("inputEncoding", "UTF-8");
+    props.setProperty("sighanPostProcessing", "true");
+    props.setProperty("keepAllWhitespaces", "false");
+
+    CRFClassifier<CoreLabel> segmenter = new CRFClassifier<>(props);
+    segmenter.loadClassifierNoExceptions(datadir + "/" + model + ".gz", props);
+    out.println("ready");
+    out.flush();
+
+    BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+    for (String line; (line = in.readLine()) != null; ) {
+      out.println(line.trim().isEmpty() ? "" : String.join(" ", segmenter.segmentString(line)));
+      if (!in.ready()) {
+        out.flush();  // a batch of lines is answered at once
+      }
+    }
+    out.flush();
+  }
+
+}
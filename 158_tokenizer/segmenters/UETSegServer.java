@@ -0,0 +1,35 @@
+import java.io.*;
+
+import vn.edu.vnu.uet.nlp.segmenter.UETSegmenter;
+
+
+/** UETsegmenter for Vietnamese kept in memory for the tokenizer server.
+ *  Reads a text per line from stdin and writes the segmented text as a line to stdout,
+ *  syllables of a word are joined with underscores. Prints a "ready" line once the models are loaded.
+ *  <p/>
+ *  <code>
+ *  Usage: java -cp "UETSegmenter/uetsegmenter.jar:segmenters" UETSegServer UETSegmenter/models/
+ *  </code>
+ */
+
+public class UETSegServer {
+
+  public static void main(String[] args) throws Exception {
+    PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), false, "UTF-8");
+    System.setOut(System.err);
+
+    UETSegmenter segmenter = new UETSegmenter(args[0]);
+    out.println("ready");
+    out.flush();
+
+    BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+    for (String line; (line = in.readLine()) != null; ) {
+      out.println(line.trim().isEmpty() ? "" : segmenter.segment(line).replaceAll("\\s+", " ").trim());
+      if (!in.ready()) {
+        out.flush();  // a batch of lines is answered at once
+      }
+    }
+    out.flush();
+  }
+
+}
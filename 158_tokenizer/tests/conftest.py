@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the servers import their modules by name and find the tokenizers relative to their directory
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,25 @@
+import pytest
+
+import tokenizer_json
+from backends import LANGUAGES, Tokenizer
+
+
+def test_langs_json_languages_are_known():
+    assert {'en', 'de', 'zh', 'ja', 'vi', 'nso', 'zea'} <= LANGUAGES
+
+
+@pytest.mark.parametrize('language', ['xx', 'en; rm -rf', 'EN', 'en\n'])
+def test_tokenizer_rejects_unknown_language(language):
+    with pytest.raises(ValueError):
+        Tokenizer([]).tokenize_batch(['text'], language)
+    with pytest.raises(ValueError):
+        Tokenizer([]).tokenize_batch(['text', 'text'], ['en', language])
+    with pytest.raises(ValueError):
+        Tokenizer([]).tokenize_document('text', language)
+
+
+@pytest.mark.parametrize('path, data', [('', {'text': 'a'}), ('batch', {'texts': ['a']}), ('document', {'text': 'a'})])
+@pytest.mark.parametrize('language', ['xx', 5, ['en']])
+def test_server_answers_400(path, data, language):
+    response = tokenizer_json.app.test_client().post('/' + path, json=dict(data, language=language))
+    assert response.status_code == 400
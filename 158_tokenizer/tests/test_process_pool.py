@@ -0,0 +1,119 @@
+import threading
+import time
+
+from backends import LineProcess, ProcessPool
+
+CAT = ['cat']  # answers every line with the same line
+
+
+def make_pool(size=2, **kwargs):
+    started = []
+
+    def factory(key):
+        worker = LineProcess(CAT)
+        started.append((key, worker))
+        return worker
+
+    return ProcessPool(factory, size, **kwargs), started
+
+
+def test_workers_are_reused():
+    pool, started = make_pool()
+    try:
+        for _ in range(3):
+            assert pool.process('en', ['a', 'b']) == ['a', 'b']
+        assert len(started) == 1
+        assert pool.workers_number == 1
+    finally:
+        pool.close()
+
+
+def test_max_workers_stops_least_recently_used():
+    pool, started = make_pool(size=2, max_workers=2)
+    try:
+        for key in ('en', 'de', 'fr'):
+            assert pool.process(key, [key]) == [key]
+        assert pool.workers_number == 2
+        assert [key for key, _ in started] == ['en', 'de', 'fr']
+        assert [worker.alive() for _, worker in started] == [False, True, True]
+    finally:
+        pool.close()
+
+
+class CountedProcess(LineProcess):
+    """Counts the processes that were started and not closed yet."""
+
+    lock = threading.Lock()
+    running = 0
+    most = 0
+
+    def __init__(self, command):
+        with CountedProcess.lock:
+            CountedProcess.running += 1
+            CountedProcess.most = max(CountedProcess.most, CountedProcess.running)
+        super().__init__(command)
+        self.counted = True
+
+    def close(self):
+        super().close()
+        with CountedProcess.lock:
+            if self.counted:
+                self.counted = False
+                CountedProcess.running -= 1
+
+
+def test_max_workers_under_concurrency():
+    pool = ProcessPool(lambda key: CountedProcess(CAT), 2, max_workers=3)
+    errors = []
+
+    def run(key):
+        try:
+            for number in range(20):
+                lines = ['{} {}'.format(key, number)] * 3
+                assert pool.process(key, lines) == lines
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(key,)) for key in ('en', 'de', 'fr', 'es', 'it') * 2]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+        assert not errors
+        assert CountedProcess.most == 3
+        assert pool.workers_number <= 3
+    finally:
+        pool.close()
+
+
+def test_reap_idle():
+    pool, started = make_pool(size=2, idle_seconds=3600)
+    try:
+        pool.process('en', ['a'])
+        pool.process('de', ['b'])
+        assert pool.reap_idle() == 0
+
+        started[0][1].last_used -= 7200
+        assert pool.reap_idle() == 1
+        assert pool.workers_number == 1
+        assert [worker.alive() for _, worker in started] == [False, True]
+
+        # a new worker is started for the reaped key
+        assert pool.process('en', ['c']) == ['c']
+        assert len(started) == 3
+    finally:
+        pool.close()
+
+
+def test_reaper_thread():
+    pool, started = make_pool(size=2, idle_seconds=0.2)
+    try:
+        pool.process('en', ['a'])
+        deadline = time.time() + 10
+        while (pool.workers_number or started[0][1].alive()) and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool.workers_number == 0
+        assert not started[0][1].alive()
+    finally:
+        pool.close()
@@ -0,0 +1,62 @@
+"""
+Smoke test of the resident Java segmenters: compiles segmenters/*.java and round-trips lines through
+the JVM processes. Needs a JDK, the jars and the models (see the README), e.g. in the tokenizer container.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from backends import CHINESE_COMMAND, VIETNAMESE_COMMAND, JavaSegmenter
+
+STANFORD_JARS = glob.glob('stanford_segmenter/*.jar')
+UET_JAR = 'UETSegmenter/uetsegmenter.jar'
+
+
+@pytest.fixture(scope='module')
+def classes(tmp_path_factory):
+    if shutil.which('javac') is None or shutil.which('java') is None:
+        pytest.skip('no JDK')
+    if not STANFORD_JARS or not os.path.exists(UET_JAR):
+        pytest.skip('the segmenter jars are not installed')
+    classes = str(tmp_path_factory.mktemp('segmenters'))
+    subprocess.run(['javac', '-cp', 'stanford_segmenter/*:' + UET_JAR, '-d', classes]
+                   + glob.glob('segmenters/*.java'), check=True)
+    return classes
+
+
+def with_classes(command, classes):
+    """The command with the freshly compiled classes instead of the ones in segmenters/."""
+    return [arg.replace(':segmenters', ':' + classes) for arg in command]
+
+
+def test_segmenters_compile(classes):
+    assert os.path.exists(os.path.join(classes, 'SegServer.class'))
+    assert os.path.exists(os.path.join(classes, 'UETSegServer.class'))
+
+
+def test_chinese_round_trip(classes):
+    if not os.path.exists('stanford_segmenter/data/pku.gz') or \
+            not os.path.exists('stanford_segmenter/data/dict-chris6.ser.gz'):
+        pytest.skip('the Stanford segmenter models are not installed')
+    segmenter = JavaSegmenter(with_classes(CHINESE_COMMAND, classes))
+    texts = ['我喜欢北京。', '', '北京大学']
+    lines = segmenter.tokenize_batch(texts)
+    assert len(lines) == len(texts)
+    assert [line.replace(' ', '') for line in lines] == texts
+    assert len(lines[0].split()) > 1
+    assert segmenter.tokenize(texts[2]) == lines[2]
+
+
+def test_vietnamese_round_trip(classes):
+    if not [fname for fname in os.listdir('UETSegmenter/models') if fname != 'README.md']:
+        pytest.skip('the UETsegmenter models are not installed')
+    segmenter = JavaSegmenter(with_classes(VIETNAMESE_COMMAND, classes))
+    texts = ['Tôi yêu Hà Nội .', '']
+    lines = segmenter.tokenize_batch(texts)
+    assert len(lines) == len(texts)
+    assert lines[0].replace('_', ' ') == texts[0]
+    assert lines[1] == ''
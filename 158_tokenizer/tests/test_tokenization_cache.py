@@ -0,0 +1,73 @@
+import os
+import time
+
+from tokenization_cache import TokenizationCache
+
+
+def result(text):
+    return {'language': 'en', 'tokens': text.split()}
+
+
+def wait_for_pruning(cache, timeout=10.):
+    deadline = time.time() + timeout
+    while (cache._pruning or cache._disk_entries is None) and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def disk_files(path):
+    return sorted(fname for _, _, fnames in os.walk(str(path)) for fname in fnames)
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    cache = TokenizationCache('1', size=2, cache_path=str(tmp_path))
+    keys = [cache.key('text {}'.format(i)) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, result('text {}'.format(i)))
+
+    assert cache.get(keys[2]) == result('text 2')
+    # evicted from memory, read from disk
+    assert cache.get(keys[0]) == result('text 0')
+    assert cache.get(cache.key('unknown')) is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = TokenizationCache('1', size=0, cache_path=str(tmp_path), disk_size=20)
+    keys = []
+    for i in range(50):
+        keys.append(cache.key('text {}'.format(i)))
+        cache.put(keys[-1], result('text {}'.format(i)))
+        wait_for_pruning(cache)
+
+    assert len(disk_files(tmp_path)) <= 20
+    assert cache.stats()['disk_entries'] == len(disk_files(tmp_path))
+    # the most recent results are kept
+    assert cache.get(keys[-1]) == result('text 49')
+
+
+def test_disk_hits_are_removed_last(tmp_path):
+    cache = TokenizationCache('1', size=0, cache_path=str(tmp_path), disk_size=10)
+    keys = [cache.key('text {}'.format(i)) for i in range(11)]
+    past = time.time() - 1000
+    for i, key in enumerate(keys[:10]):
+        cache.put(key, result('text {}'.format(i)))
+        wait_for_pruning(cache)
+        os.utime(cache._fpath(key), (past + i, past + i))
+
+    assert cache.get(keys[0]) == result('text 0')  # the oldest file becomes the most recent one
+    cache.put(keys[10], result('text 10'))
+    wait_for_pruning(cache)
+
+    assert cache.get(keys[0]) == result('text 0')
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[10]) == result('text 10')
+
+
+def test_disk_tier_without_limit(tmp_path):
+    cache = TokenizationCache('1', size=0, cache_path=str(tmp_path), disk_size=0)
+    for i in range(30):
+        cache.put(cache.key('text {}'.format(i)), result('text {}'.format(i)))
+    assert len(disk_files(tmp_path)) == 30
+    assert cache.stats()['disk_entries'] is None
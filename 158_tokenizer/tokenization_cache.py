@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class TokenizationCache(object):
+    """
+    Bounded LRU cache of tokenization results keyed by a hash of (tokenizer version, language hint, text),
+    with an optional on-disk tier: a {cache_path}/{key[:2]}/{key}.json file per result that is shared by
+    the server processes and survives restarts. When the disk tier has more than disk_size files, the least
+    recently used ones are removed by a background thread until 90% of disk_size are left; a disk hit
+    updates the modification time of its file. The disk tier can also be removed at any time.
+    """
+
+    def __init__(self, version, size=100000, cache_path=None, disk_size=1000000):
+        self.version = version
+        self.size = size
+        self.cache_path = cache_path or None
+        self.disk_size = disk_size or None
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_entries = None  # counted on first write, other processes write to the same directory
+        self._pruning = False
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text, language=None):
+        data = json.dumps([self.version, language or '', text], ensure_ascii=False)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _fpath(self, key):
+        return os.path.join(self.cache_path, key[:2], key + '.json')
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def get(self, key):
+        """Returns the cached {'language': language, 'tokens': [token, ...]} or None."""
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+        if value is None and self.cache_path is not None:
+            try:
+                with open(self._fpath(key), encoding='utf-8') as f:
+                    result = json.load(f)
+                value = (result['language'], tuple(result['tokens']))
+                if self.disk_size is not None:
+                    os.utime(self._fpath(key))  # recently used, removed last
+            except (OSError, ValueError, KeyError):
+                pass
+            else:
+                self._remember(key, value)
+                with self._lock:
+                    self.disk_hits += 1
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        # a new dict for every caller, the cached tokens are never changed
+        return {'language': value[0], 'tokens': list(value[1])}
+
+    def put(self, key, result):
+        if self.size > 0:
+            self._remember(key, (result['language'], tuple(result['tokens'])))
+        if self.cache_path is not None:
+            fpath = self._fpath(key)
+            tmp_fpath = '{}.{}.{}.tmp'.format(fpath, os.getpid(), threading.get_ident())
+            try:
+                os.makedirs(os.path.dirname(fpath), exist_ok=True)
+                with open(tmp_fpath, 'w', encoding='utf-8') as out:
+                    json.dump(result, out, ensure_ascii=False)
+                os.replace(tmp_fpath, fpath)
+            except OSError:
+                pass  # e.g. a full disk, the result is tokenized again next time
+            else:
+                self._count_disk_entry()
+
+    def _disk_files(self):
+        """Paths of the result files in the disk tier with their modification times."""
+        files = []
+        for directory in os.scandir(self.cache_path):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith('.json'):
+                    try:
+                        files.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass  # removed meanwhile
+        return files
+
+    def _count_disk_entry(self):
+        if self.disk_size is None:
+            return
+        with self._lock:
+            if self._disk_entries is not None:
+                self._disk_entries += 1
+            if self._pruning or (self._disk_entries is not None and self._disk_entries <= self.disk_size):
+                return
+            self._pruning = True
+        threading.Thread(target=self._prune_disk, daemon=True).start()
+
+    def _prune_disk(self):
+        """Counts the files of the disk tier and removes the least recently used ones if there are too many."""
+        removed = 0
+        try:
+            files = self._disk_files()
+            if len(files) > self.disk_size:
+                files.sort()
+                for _, fpath in files[:len(files) - int(self.disk_size * 0.9)]:
+                    try:
+                        os.remove(fpath)
+                        removed += 1
+                    except OSError:
+                        pass  # removed by another process
+        except OSError:
+            files = []
+        finally:
+            with self._lock:
+                self._disk_entries = len(files) - removed
+                self._pruning = False
+        return removed
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.disk_hits + self.misses
+            return {'size': len(self._items),
+                    'disk_entries': self._disk_entries,
+                    'hits': self.hits,
+                    'disk_hits': self.disk_hits,
+                    'misses': self.misses,
+                    'hit_rate': (self.hits + self.disk_hits) / requests if requests else 0.}
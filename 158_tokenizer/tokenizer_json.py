@@ -1,104 +1,100 @@
 #!/usr/bin/env python3
 
 import configparser
-import subprocess
-import tempfile
 import codecs
 
-import MeCab
-import icu
 from werkzeug.serving import run_simple
 from werkzeug.wrappers import Request, Response
-from flask import Flask, request, jsonify
+from flask import Flask, abort
+
+from backends import LANGUAGES, Tokenizer
+from wire_format import get_request_data, make_response
 
 config = configparser.ConfigParser()
 config.read('158.ini')
 icu_langs = set(config.get('tokenizer', 'icu_langs').strip().split(','))
 
-mecab = MeCab.Tagger("-Owakati")  # Japanese tokenizer
+tokenizer = Tokenizer(icu_langs,
+                      moses_pool_size=config.getint('tokenizer', 'moses_pool_size', fallback=2),
+                      segmenter_pool_size=config.getint('tokenizer', 'segmenter_pool_size', fallback=1),
+                      mecab_pool_size=config.getint('tokenizer', 'mecab_pool_size', fallback=4),
+                      timeout=config.getfloat('tokenizer', 'backend_timeout', fallback=30.),
+                      lid_prefix=config.getint('tokenizer', 'lid_prefix', fallback=1000),
+                      cache_size=config.getint('tokenizer', 'cache_size', fallback=100000),
+                      cache_path=config.get('tokenizer', 'cache_path', fallback=None),
+                      cache_disk_size=config.getint('tokenizer', 'cache_disk_size', fallback=1000000),
+                      document_chars=config.getint('tokenizer', 'document_chars', fallback=0),
+                      moses_max_processes=config.getint('tokenizer', 'moses_max_processes', fallback=32),
+                      moses_idle_seconds=config.getfloat('tokenizer', 'moses_idle_seconds', fallback=600.))
 
 app = Flask(__name__)
 
 
-def tokenize_sentence(text, exotic_langs):
-    with subprocess.Popen(['language_identification/fasttext', 'predict', 'language_identification/lid.176.ftz', '-'],
-                          stdin=subprocess.PIPE, stdout=subprocess.PIPE) as identifier:
-        language = identifier.communicate(text.encode('utf-8'))[0]
-
-    language = language.decode('utf-8').strip().split('__')[-1]
-
-    if language == 'zh':
-        tokens = tokenize_chinese(text)
-    elif language == 'vi':
-        tokens = tokenize_vietnamese(text)
-    elif language == 'ja':
-        tokens = tokenize_japanese(text)
-    elif language in exotic_langs:
-        tokens = tokenize_icu(text, language)
-    else:
-        with subprocess.Popen(['Europarl/tokenizer.perl', '-l', language], stdin=subprocess.PIPE,
-                              stdout=subprocess.PIPE) as tokenizer:
-            tokens = tokenizer.communicate(text.encode('utf-8'))[0]
-
-        tokens = tokens.decode('utf-8').strip()
-
-    return {'language': language, 'tokens': tokens.split()}
-
-
-def tokenize_chinese(text):
-
-    with tempfile.NamedTemporaryFile(mode="w") as f:
-        f.write(text)
-        f.flush()
-
-        with subprocess.Popen(['stanford_segmenter/segment.sh', 'pku', f.name, 'UTF-8', '0'],
-                              stdout=subprocess.PIPE) as tokenizer:
-            tokens = tokenizer.communicate()[0].decode('utf-8')
-
-    return tokens
+def tokenize_sentence(text, language=None):
+    return tokenizer.tokenize(text, language)
 
 
-def tokenize_japanese(text):
-    tokenized = mecab.parse(text)
-    return tokenized.strip()
-
-
-def tokenize_vietnamese(text):
-    with tempfile.NamedTemporaryFile() as fr, tempfile.NamedTemporaryFile('r') as fw:
-        fr.write(text.encode('utf-8'))
-        fr.flush()
-
-        subprocess.call(
-            ['java', '-jar', 'UETSegmenter/uetsegmenter.jar', '-r', 'seg', '-m', 'UETSegmenter/models/',
-             '-i', fr.name, '-o', fw.name])
-
-        fw.seek(0)
-
-        tokens = fw.read()
-
-    return tokens
-
-
-def tokenize_icu(text, language):
-    bd = icu.BreakIterator.createWordInstance(icu.Locale(language))
-    bd.setText(text)
-    start_pos = 0
-    tokens = ''
-    for obj in bd:
-        tokens += text[start_pos:obj]
-        tokens += ' '
-        start_pos = obj
-    return tokens
+def get_language_hint(req_data):
+    language = req_data.get('language')
+    if language is not None and not isinstance(language, str):
+        abort(400, "language should be a language code")
+    if language and language not in LANGUAGES:
+        # every language starts its own tokenizer processes, so only the known ones are accepted
+        abort(400, "Unknown language {}".format(language))
+    return language or None
 
 
 @app.route("/", methods=['POST'])
 def tokenize():
-    req_json = request.json
-    text = req_json['text']
-    result = tokenize_sentence(text.strip(), icu_langs)
-
-    results_json = jsonify(result)
-    return results_json
+    req_data = get_request_data()
+    text = req_data['text']
+    result = tokenize_sentence(text.strip(), get_language_hint(req_data))
+
+    return make_response(result)
+
+
+@app.route("/batch", methods=['POST'])
+def tokenize_batch():
+    """
+    Tokenizes a list of texts at once: {"texts": [...]} => {"results": [{"language": ..., "tokens": [...]}, ...]}
+    An optional "language" skips the language identification of all the texts.
+    With "columnar": true the results are {"language": [...], "tokens": [[...], ...]}.
+    """
+    req_data = get_request_data()
+    texts = req_data['texts']
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise Exception("texts should be a list of strings")
+
+    results = tokenizer.tokenize_batch([text.strip() for text in texts], get_language_hint(req_data))
+    if req_data.get('columnar'):
+        results = {'language': [result['language'] for result in results],
+                   'tokens': [result['tokens'] for result in results]}
+    return make_response({'results': results})
+
+
+@app.route("/document", methods=['POST'])
+def tokenize_document():
+    """
+    Tokenizes a long text sentence by sentence in parallel: {"text": ...} =>
+    {"language": ..., "tokens": [...], "offsets": [[start, end], ...], "sentences": [[start, end], ...]}
+    """
+    req_data = get_request_data()
+    text = req_data['text']
+    return make_response(tokenizer.tokenize_document(text, get_language_hint(req_data)))
+
+
+@app.route("/language", methods=['POST'])
+def identify_language():
+    """Identifies the language of a text by its beginning only: {"text": ...} => {"language": ...}"""
+    req_data = get_request_data()
+    text = req_data['text']
+    return make_response({'language': tokenizer.identify(text.strip())})
+
+
+@app.route("/stats", methods=['GET'])
+def cache_stats():
+    """Hit rate and size of the tokenization cache of this server process."""
+    return make_response(tokenizer.cache.stats())
 
 
 if __name__ == '__main__':
@@ -1,132 +1,96 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
-import os
-import socket
-import threading
+import asyncio
 import datetime
 import sys
 import json
 import configparser
-import subprocess
-import hashlib
-import time
-import MeCab
-import PyICU
-
-
-def tokenize(sentence, exotic_langs):
-    results = {}
-    identifier = \
-        subprocess.Popen(['language_identification/fasttext', 'predict', 'language_identification/lid.176.ftz', '-'],
-                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-    language = identifier.communicate(sentence)[0].strip()
-    language = language.decode('utf-8').split('__')[-1]
-    results['lang'] = language
-    if language == 'zh':
-        tokens = tokenize_chinese(sentence)
-    elif language == 'vi':
-        tokens = tokenize_vietnamese(sentence)
-    elif language == 'ja':
-        tokens = tokenize_japanese(sentence)
-    elif language in exotic_langs:
-        tokens = tokenize_icu(sentence, language)
-    else:
-        tokenizer = \
-            subprocess.Popen(['Europarl/tokenizer.perl', '-l', language], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-        tokens = tokenizer.communicate(sentence)[0].strip().decode('utf-8')
-    results['tokens'] = tokens.split()
-    return results
-
-
-def tokenize_chinese(text):
-    dochash = hashlib.sha1()
-    timestring = str(time.time()).encode('utf-8')
-    dochash.update(timestring)
-    filename = 'chinese_text_' + dochash.hexdigest() + '.txt'
-    doc = open(filename, 'w')
-    doc.write(text.decode('utf-8'))
-    doc.close()
-    tokenizer = \
-        subprocess.Popen(['stanford_segmenter/segment.sh', 'pku', filename, 'UTF-8', '0'], stdout=subprocess.PIPE)
-    tokens = tokenizer.communicate()[0].decode('utf-8')
-    os.remove(filename)
-    return tokens
-
-
-def tokenize_japanese(text):
-    tokenized = mecab.parse(text.decode('utf-8'))
-    tokens = tokenized.strip()
-    return tokens
-
-
-def tokenize_vietnamese(text):
-    dochash = hashlib.sha1()
-    timestring = str(time.time()).encode('utf-8')
-    dochash.update(timestring)
-    filename = 'vietnamese_text_' + dochash.hexdigest() + '.txt'
-    doc = open(filename, 'w')
-    doc.write(text.decode('utf-8'))
-    doc.close()
-    outfilename = 'vietnamese_tokens_' + dochash.hexdigest() + '.txt'
-    subprocess.call(['java', '-jar', 'UETSegmenter/uetsegmenter.jar', '-r', 'seg', '-m', 'UETSegmenter/models/', '-i',
-                     filename, '-o', outfilename])
-    os.remove(filename)
-    outf = open(outfilename, 'r')
-    tokens = outf.read()
-    outf.close()
-    os.remove(outfilename)
-    return tokens
-
-
-def tokenize_icu(text, lang):
-    bd = PyICU.BreakIterator.createWordInstance(PyICU.Locale(lang))
-    text = text.decode('utf-8')
-    bd.setText(text)
-    start_pos = 0
-    tokens = ""
-    for obj in bd:
-        tokens += text[start_pos:obj]
-        tokens += ' '
-        start_pos = obj
-    return tokens
-
-
-class TokThread(threading.Thread):
-    def __init__(self, connect, address):
-        threading.Thread.__init__(self)
-        self.connect = connect
-        self.address = address
-
-    def run(self):
-        threadLimiter.acquire()
-        try:
-            clientthread(self.connect, self.address)
-        finally:
-            threadLimiter.release()
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import Tokenizer
+
+# Every request is one utf-8 line, every reply is one JSON line, in the order of the requests.
+# A client can pipeline any number of lines on one connection: the complete lines of every chunk read
+# from the socket are tokenized as one batch in the executor while the next chunk is read.
+READ_SIZE = 1 << 16
+
+
+def tokenize_batch(sentences):
+    """Tokenizes the lines of a request at once, the lines are grouped by language."""
+    return [{'lang': result['language'], 'tokens': result['tokens']} for result in tokenizer.tokenize_batch(sentences)]
 
 
-def clientthread(connect, address):
-    # Function for handling connections. This will be used to create threads
+def log(address, message):
+    now = datetime.datetime.now()
+    print(now.strftime("%Y-%m-%d %H:%M"), '\t', address[0] + ':' + str(address[1]), '\t', message, file=sys.stderr)
 
-    # infinite loop so that function do not terminate and thread do not end.
+
+async def read_batches(reader, address, pending):
+    """Splits the input into lines and schedules their tokenization, waits when too many batches are pending."""
+    loop = asyncio.get_running_loop()
+    rest = b''
     while True:
-        # Receiving from client
-        data = connect.recv(4096)
+        data = await reader.read(READ_SIZE)
+        if data:
+            *lines, rest = (rest + data).split(b'\n')
+        else:
+            lines, rest = ([rest] if rest.strip() else []), b''
+
+        queries = [line.decode('utf-8', errors='replace').strip() for line in lines]
+        if queries:
+            log(address, '{} lines, cache hit rate {:.1%}'.format(len(queries), tokenizer.cache.stats()['hit_rate']))
+            # blocks here while the client does not read its replies, so the socket is not read either
+            await pending.put((len(queries), loop.run_in_executor(executor, tokenize_batch, queries)))
+
         if not data:
             break
-        queries = data.decode('utf-8').strip().split('\n')
-        for query in queries:
-            output = tokenize(query.encode('utf-8').strip(), icu_langs)
-            now = datetime.datetime.now()
-            print(now.strftime("%Y-%m-%d %H:%M"), '\t', address[0] + ':' + str(address[1]), '\t',
-                  data.decode('utf-8').strip(), file=sys.stderr)
-            reply = json.dumps(output, ensure_ascii=False).encode('utf-8')
-            connect.sendall(reply)
-        break
+        if len(rest) > max_line_bytes:
+            log(address, 'Line longer than {} bytes, closing the connection'.format(max_line_bytes))
+            break
+    await pending.put(None)
+
 
-    # came out of loop
-    connect.close()
+async def write_replies(writer, address, pending):
+    while True:
+        batch = await pending.get()
+        if batch is None:
+            break
+        size, outputs = batch
+        try:
+            outputs = await outputs
+        except Exception as e:
+            log(address, 'Tokenization failed: {}'.format(e))
+            outputs = [{'error': str(e)}] * size
+        for output in outputs:
+            writer.write(json.dumps(output, ensure_ascii=False).encode('utf-8') + b'\n')
+        await writer.drain()
+
+
+async def handle_client(reader, writer):
+    address = writer.get_extra_info('peername')
+    pending = asyncio.Queue(maxsize=max_pending)
+    tasks = [asyncio.ensure_future(read_batches(reader, address, pending)),
+             asyncio.ensure_future(write_replies(writer, address, pending))]
+    try:
+        await asyncio.gather(*tasks)
+    except ConnectionError as e:
+        log(address, 'Connection lost: {}'.format(e))
+    finally:
+        for task in tasks:
+            task.cancel()
+        writer.close()
+
+
+async def serve():
+    try:
+        server = await asyncio.start_server(handle_client, HOST, PORT, backlog=100)
+    except OSError as msg:
+        print('Bind failed. Error Code : ' + str(msg), file=sys.stderr)
+        sys.exit()
+    print('Socket now listening on port', PORT, file=sys.stderr)
+    async with server:
+        await server.serve_forever()
 
 
 config = configparser.RawConfigParser()
@@ -137,32 +101,26 @@ icu_langs = set(config.get('Languages', 'icu_langs').strip().split(','))
 root = config.get('Files and directories', 'root')
 HOST = config.get('Sockets', 'host')  # Symbolic name meaning all available interfaces
 PORT = config.getint('Sockets', 'port')  # Arbitrary non-privileged port
-maxthreads = config.getint('Other', 'maxthreads')  # Maximum number of threads
-threadLimiter = threading.BoundedSemaphore(maxthreads)
-
-mecab = MeCab.Tagger("-Owakati")  # Japanese tokenizer
-
-# Bind socket to local host and port
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-print('Socket created with max number of active threads set to', maxthreads, file=sys.stderr)
+maxthreads = config.getint('Other', 'maxthreads')  # Maximum number of batches tokenized at once
+max_pending = config.getint('Other', 'max_pending', fallback=16)  # Batches of a connection waiting for a reply
+max_line_bytes = config.getint('Other', 'max_line_bytes', fallback=1 << 20)
+executor = ThreadPoolExecutor(max_workers=maxthreads)
+
+tokenizer = Tokenizer(icu_langs,
+                      moses_pool_size=config.getint('Other', 'moses_pool_size', fallback=2),
+                      segmenter_pool_size=config.getint('Other', 'segmenter_pool_size', fallback=1),
+                      mecab_pool_size=config.getint('Other', 'mecab_pool_size', fallback=4),
+                      timeout=config.getfloat('Other', 'backend_timeout', fallback=30.),
+                      cache_size=config.getint('Other', 'cache_size', fallback=100000),
+                      cache_path=config.get('Other', 'cache_path', fallback=None),
+                      cache_disk_size=config.getint('Other', 'cache_disk_size', fallback=1000000),
+                      document_chars=config.getint('Other', 'document_chars', fallback=0),
+                      moses_max_processes=config.getint('Other', 'moses_max_processes', fallback=32),
+                      moses_idle_seconds=config.getfloat('Other', 'moses_idle_seconds', fallback=600.))
+
+print('Tokenizing with max number of active threads set to', maxthreads, file=sys.stderr)
 
 try:
-    s.bind((HOST, PORT))
-except socket.error as msg:
-    print('Bind failed. Error Code : ' + str(msg), file=sys.stderr)
-    sys.exit()
-
-print('Socket bind complete', file=sys.stderr)
-
-# Start listening on socket
-s.listen(100)
-print('Socket now listening on port', PORT, file=sys.stderr)
-
-# now keep talking with the client
-while 1:
-    # wait to accept a connection
-    conn, addr = s.accept()
-
-    # start new thread takes 1st argument as a function name to be run, 2nd is the tuple of arguments to the function.
-    thread = TokThread(conn, addr)
-    thread.start()
+    asyncio.run(serve())
+except KeyboardInterrupt:
+    pass
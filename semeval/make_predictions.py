@@ -6,17 +6,25 @@ import pandas as pd
 import random
 import requests
 import json
+import msgpack
 
 options = [1, 2, 3, 4, 5]
-json_headers = {'Content-type': 'application/json'}
+# answers in MessagePack are smaller and faster to decode, servers that do not support it answer in JSON
+json_headers = {'Content-type': 'application/json', 'Accept': 'application/msgpack, application/json;q=0.5'}
 tokenizer_url = 'http://ltdemos.informatik.uni-hamburg.de/uwsd1580-tokenize'
 disambiguator_url = 'http://ltdemos.informatik.uni-hamburg.de/uwsd158-api/disambiguate'
 
 
+def decode(response):
+    if response.headers.get('Content-type', '').startswith('application/msgpack'):
+        return msgpack.unpackb(response.content, raw=False)
+    return response.json()
+
+
 def disambiguate(word, text, lemmas=True):
     if not lemmas:
         question = requests.post(tokenizer_url, data=json.dumps({"text": text}), headers=json_headers)
-        tokenized = question.json()
+        tokenized = decode(question)
     else:
         tokenized = {'language': 'en', 'tokens': text.split()}
     print('Sentence length:', len(tokenized['tokens']))
@@ -25,10 +33,12 @@ def disambiguate(word, text, lemmas=True):
         return None, None, None
     token_nr = tokenized['tokens'].index(word)
     print(tokenized)
-    disambiguation_req = requests.post(disambiguator_url, data=json.dumps(tokenized), headers=json_headers)
+    # only the best sense is needed, servers without the top option ignore it
+    disambiguation_req = requests.post(disambiguator_url, data=json.dumps(dict(tokenized, top=1)),
+                                       headers=json_headers)
     # print(disambiguation_req)
     try:
-        disambiguation = disambiguation_req.json()
+        disambiguation = decode(disambiguation_req)
     except:
         print('ERROR!', text)
         return None, None, None